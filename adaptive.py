@@ -0,0 +1,98 @@
+import numpy as np
+
+from amortization import amortization_table
+from constants import *
+from grid_engine import GridEngine
+from scenario import DEFAULT_SCENARIO
+
+
+OBJECTIVES = ('annual_ROI', 'x_years_avg_annual_roi')
+
+
+class AdaptiveSearch(object):
+    # Finds the winners of the fine grid, terms in months and downpayments in fractions of a
+    # percent, without evaluating it. For a fixed term every constraint is a single cut in the
+    # downpayment and both ROIs are linear-fractional on either side of the zero-income point
+    # (see feasibility.py), so a term's best cells can only sit at the feasible range ends, next
+    # to that point or at the full downpayment. Those locations are worked out coarsely from the
+    # closed forms for every term at once, then a few fine cells either side of each are evaluated
+    # exactly, which absorbs the rounding of the estimates.
+    #
+    # Cells are kept in integer ticks, months and downpayment_percent * downpayment_resolution,
+    # so ties resolve in the (term, downpayment) order a brute force scan of the fine grid would.
+
+    # fine cells evaluated either side of every estimated location
+    window = 1
+
+    def __init__(self, month_step=ADAPTIVE_MONTH_STEP, downpayment_resolution=ADAPTIVE_DOWNPAYMENT_RESOLUTION,
+                 period_years=VISUALIZING_ROI_YEARS):
+        self.month_step = month_step
+        self.downpayment_resolution = downpayment_resolution
+        self.engine = GridEngine(period_years)
+
+        self.evaluations = 0
+
+    def search(self, prop, min_num_years, max_num_year, min_downpayment_percent, max_downpayment_percent,
+               scenario=None):
+        # {objective: (num_months, downpayment_percent) or None}
+        scenario = scenario or DEFAULT_SCENARIO
+
+        num_months = np.arange(int(min_num_years * MONTHS), int(max_num_year * MONTHS) + 1, self.month_step)
+        ticks = self.candidate_ticks(
+            prop, num_months,
+            min_downpayment_percent * self.downpayment_resolution,
+            max_downpayment_percent * self.downpayment_resolution,
+            scenario,
+        )
+
+        self.evaluations = ticks.size
+        result = self.engine.evaluate_months(prop, num_months, ticks / float(self.downpayment_resolution), scenario)
+
+        winners = {}
+        for objective in OBJECTIVES:
+            values = np.where(result.feasible, getattr(result, objective), -np.inf)
+            values = np.where(np.isnan(values), -np.inf, values)
+            winners[objective] = self.first_maximum(values, num_months, ticks)
+        return winners
+
+    def candidate_ticks(self, prop, num_months, lowest, highest, scenario):
+        # (terms, candidates) downpayment ticks, duplicates are harmless
+        resolution = 100.00 * self.downpayment_resolution
+        # same key expression as GridEngine.evaluate_months, so these are table hits there
+        factors = np.array([
+            amortization_table.factor(scenario.monthly_interest_rate, term_months / MONTHS * MONTHS)
+            for term_months in num_months
+        ])
+        price = prop.price
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            exceeded_downpayment = resolution * scenario.max_downpayment / price
+            small_principal = resolution * (1 - scenario.minimum_loan_principal / price)
+            affordable = resolution * (1 - scenario.max_monthly_installment / (factors * price))
+            zero_income = resolution * (1 - prop.afterloan_monthly_income / (factors * price))
+
+        shape = num_months.shape
+        estimates = np.stack([
+            np.full(shape, lowest),
+            np.full(shape, highest),
+            np.full(shape, np.floor(exceeded_downpayment)),
+            np.full(shape, np.floor(small_principal)),
+            np.ceil(affordable),
+            np.floor(zero_income),
+            np.ceil(zero_income),
+            np.full(shape, 100 * self.downpayment_resolution),
+        ], axis=1)
+        estimates = np.clip(np.nan_to_num(estimates, nan=lowest, posinf=highest, neginf=lowest), lowest, highest)
+
+        offsets = np.arange(-self.window, self.window + 1)
+        ticks = (estimates[:, :, np.newaxis] + offsets).reshape(len(num_months), -1)
+        return np.clip(ticks, lowest, highest).astype(np.int64)
+
+    def first_maximum(self, values, num_months, ticks):
+        best = values.max() if values.size else -np.inf
+        if best <= MINIMUM_DECIMAL:
+            return None
+
+        row = np.flatnonzero((values == best).any(axis=1))[0]
+        tick = ticks[row][values[row] == best].min()
+        return int(num_months[row]), tick / float(self.downpayment_resolution)
@@ -0,0 +1,120 @@
+import math
+
+import numpy as np
+
+from frontier import pareto_frontier
+from permutation import calc_equity_with_loan
+from permutation_grid import METRICS
+from ranking import RankedOption
+from ranking import RankingQuery
+
+from constants import *
+
+
+ALLOCATION_OBJECTIVES = ('immediate', 'x_years')
+
+EQUITY_INDEX = METRICS.index('equity')
+TOTAL_ANNUAL_INCOME_INDEX = METRICS.index('total_annual_income')
+X_YEARS_ROI_INDEX = METRICS.index('x_years_avg_annual_roi')
+
+
+def option_income(record, num_years, objective):
+    # annual income of an option, the x-years one averaged over the period like x_years_avg_annual_roi
+    total_annual_income = record[TOTAL_ANNUAL_INCOME_INDEX]
+    if objective == 'immediate':
+        return total_annual_income
+
+    # over the same equity the x-years ROI is taken over
+    return record[X_YEARS_ROI_INDEX] * calc_equity_with_loan(record[EQUITY_INDEX], total_annual_income, num_years)
+
+
+class AllocationQuery(RankingQuery):
+    # Keeps the options worth spending on: a positive income and no other option of the property
+    # earning as much for the same or fewer equity steps. Equity is rounded up to whole steps, so
+    # an allocation never goes over the budget.
+
+    def __init__(self, equity_step=ALLOCATION_EQUITY_STEP, objective='immediate', max_equity=None,
+                 max_monthly_installment=None, min_area=None, max_area=None):
+        if objective not in ALLOCATION_OBJECTIVES:
+            raise ValueError('Objective "{}" not supported. Supported objectives are: {}'.format(
+                objective, ALLOCATION_OBJECTIVES))
+
+        super(AllocationQuery, self).__init__(
+            top_k=None, rank_by='immediate', max_equity=max_equity, max_monthly_installment=max_monthly_installment,
+            min_area=min_area, max_area=max_area)
+        self.equity_step = equity_step
+        self.objective = objective
+
+    def equity_steps(self, equity):
+        return int(math.ceil(equity / self.equity_step))
+
+    def rank_property(self, prop):
+        # pruned as plain tuples, only the options kept become RankedOptions
+        candidates = []
+        for _, num_years, downpayment_percent, record in self.iter_candidates(prop):
+            income = option_income(record, num_years, self.objective)
+            if income > 0.00:
+                candidates.append((self.equity_steps(record[EQUITY_INDEX]), income, num_years, downpayment_percent,
+                                   record))
+
+        return [
+            RankedOption(prop, num_years, downpayment_percent, income, record)
+            for _, income, num_years, downpayment_percent, record in pareto_frontier(
+                candidates, lambda candidate: (candidate[0], candidate[1], 0.0))
+        ]
+
+
+class CapitalAllocation(object):
+    # Picks at most one option per property to maximise the total income within the equity budget,
+    # a multiple-choice knapsack solved by dynamic programming over whole equity steps. best[c] is
+    # the most income the properties so far earn with at most c steps; every property updates the
+    # whole array at once per option, so the work is properties x options x steps numpy-side.
+
+    def __init__(self, query, budget):
+        self.query = query
+        self.budget = budget
+        self.capacity = int(budget // query.equity_step)
+
+        self.best = np.zeros(self.capacity + 1)
+        self.groups = []
+
+    def add_options(self, options):
+        options = [option for option in options if self.query.equity_steps(option.equity) <= self.capacity]
+        if not options:
+            return
+
+        best = self.best
+        updated = best.copy()
+        # option picked at every capacity, -1 to skip the property
+        choice = np.full(self.capacity + 1, -1, dtype=np.int32)
+        for index, option in enumerate(options):
+            steps = self.query.equity_steps(option.equity)
+            candidate = best[:self.capacity + 1 - steps] + option.score
+            # strictly better, so ties keep skipping and then the earlier, cheaper option
+            better = candidate > updated[steps:]
+            updated[steps:][better] = candidate[better]
+            choice[steps:][better] = index
+
+        self.best = updated
+        self.groups.append((options, choice))
+
+    def add_property(self, prop):
+        self.add_options(self.query.rank_property(prop))
+
+    def results(self):
+        # walks the choices back from the full budget, in input order
+        allocation = []
+        capacity = self.capacity
+        for options, choice in reversed(self.groups):
+            index = choice[capacity]
+            if index >= 0:
+                option = options[index]
+                allocation.append(option)
+                capacity -= self.query.equity_steps(option.equity)
+
+        allocation.reverse()
+        return allocation
+
+    @property
+    def total_income(self):
+        return float(self.best[self.capacity])
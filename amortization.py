@@ -0,0 +1,69 @@
+import math
+from collections import OrderedDict
+
+from constants import *
+
+
+class AmortizationTable(object):
+
+    def __init__(self, max_size=AMORTIZATION_TABLE_SIZE):
+        self.max_size = max_size
+        self.factors = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+    def factor(self, monthly_interest_rate, num_payments):
+        # https://mortgage.lovetoknow.com/Calculate_Mortgage_Payments_Formula
+        key = (monthly_interest_rate, num_payments)
+        try:
+            factor = self.factors[key]
+        except KeyError:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.factors.move_to_end(key)
+            return factor
+
+        if monthly_interest_rate == 0:
+            # the annuity formula is 0/0 without interest, the principal is simply spread evenly
+            factor = 1.0 / num_payments
+        else:
+            term = math.pow(1 + monthly_interest_rate, num_payments)
+            factor = (monthly_interest_rate * term) / (term - 1)
+
+        self.factors[key] = factor
+        if len(self.factors) > self.max_size:
+            self.factors.popitem(last=False)
+
+        return factor
+
+    def precompute(self, monthly_interest_rate, min_num_years, max_num_year):
+        return [
+            self.factor(monthly_interest_rate, num_years * MONTHS)
+            for num_years in range(min_num_years, max_num_year + 1)
+        ]
+
+    def installment(self, loan_principal, monthly_interest_rate, num_payments):
+        return loan_principal * self.factor(monthly_interest_rate, num_payments)
+
+    def counts(self):
+        # (hits, misses) so far, the difference of two readings is what happened in between
+        return self.hits, self.misses
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self.factors),
+            'hit_rate': float(self.hits) / lookups if lookups else 0.0,
+        }
+
+    def clear(self):
+        self.factors.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+amortization_table = AmortizationTable()
@@ -0,0 +1,269 @@
+import argparse
+import csv
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from amortization import amortization_table
+from calc_loan import LandlordPropertyCalculator
+from calc_loan import XLSXWriter
+from constants import *
+from property import Property
+from scenario import Scenario
+
+
+LISTING_FIELDS = (
+    'price', 'rent', 'reletting_factor', 'gov_tax_discount', 'area', 'extra_onetime_expense', 'name', 'url',
+)
+
+GRID_SIZES = {
+    'small': (1, 10, 20, 100),
+    'default': (MIN_NUM_YEARS, MAX_NUM_YEARS, MIN_DOWNPAYMENT_PERCENT, MAX_DOWNPAYMENT_PERCENT),
+    'large': (1, 40, 5, 100),
+}
+
+# bank rates of the scenarios swept, the first sweep_scenarios are used
+SWEEP_RATES = (3.0, 4.5, 6.0, 7.5, 9.0)
+
+# a stage slower than baseline by more than this ratio is reported as a regression
+REGRESSION_THRESHOLD = 1.10
+
+
+def generate_listings(output_path, num_rows, seed=0):
+    rng = random.Random(seed)
+
+    with open(output_path, 'wt', newline='') as output_file:
+        writer = csv.writer(output_file)
+        writer.writerow(LISTING_FIELDS)
+
+        for index in range(num_rows):
+            area = round(rng.lognormvariate(4.3, 0.35))
+            price_per_meter = rng.lognormvariate(7.0, 0.4)
+            price = round(area * price_per_meter, -2)
+            # gross yields mostly between 4% and 9%
+            rent = round(price * rng.uniform(0.04, 0.09) / MONTHS)
+
+            writer.writerow((
+                price,
+                rent,
+                rng.choice((0.0, 0.5, 1.0, 1.5)),
+                rng.choice((0.0, 0.0, 0.25, 0.5)),
+                area,
+                rng.choice((0, 0, 500, 1500, 5000)),
+                'Listing {}'.format(index),
+                'https://example.com/listings/{}'.format(index),
+            ))
+
+
+class Benchmark(object):
+
+    def __init__(self, input_path, grid_sizes=('default',), engines=('permutation',), process_limit=1000,
+                 write_limit=20, trace_memory=False, sweep_scenarios=3):
+        self.input_path = input_path
+        self.grid_sizes = grid_sizes
+        self.engines = engines
+        self.process_limit = process_limit
+        self.write_limit = write_limit
+        self.trace_memory = trace_memory
+        self.sweep_scenarios = sweep_scenarios
+
+        self.stages = {}
+
+    def measure(self, stage, function, items=None, permutations=None):
+        if self.trace_memory:
+            tracemalloc.start()
+
+        hits, misses = amortization_table.counts()
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+
+        # ru_maxrss is the peak of the whole process so far, a stage only shows by how much it raised it
+        lifetime_peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        stats = {
+            'seconds': elapsed,
+            'amortization_hits': amortization_table.hits - hits,
+            'amortization_misses': amortization_table.misses - misses,
+            'lifetime_peak_rss_kb': lifetime_peak_rss,
+            'peak_rss_growth_kb': lifetime_peak_rss - peak_rss,
+        }
+        if self.trace_memory:
+            stats['peak_traced_bytes'] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        if items is not None:
+            stats['properties'] = items
+            stats['properties_per_sec'] = items / elapsed if elapsed else None
+        if callable(permutations):
+            permutations = permutations()
+        if permutations is not None:
+            stats['permutations'] = permutations
+            stats['permutations_per_sec'] = permutations / elapsed if elapsed else None
+
+        self.stages[stage] = stats
+        print('{:<48} {:>10.3f}s'.format(stage, elapsed))
+        return result
+
+    def run(self):
+        # a fresh interpreter importing the CLI, which is what every cron or CI invocation pays
+        cli_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'calc_loan.py')
+        self.measure(
+            'cli_cold_start',
+            lambda: subprocess.run([sys.executable, cli_path, '--help'], check=True, stdout=subprocess.DEVNULL),
+        )
+
+        calculator = LandlordPropertyCalculator(self.input_path)
+
+        rows = self.measure('read_csv_input', lambda: calculator.read_csv_input(self.input_path))
+        self.stages['read_csv_input']['properties'] = len(rows)
+
+        properties = self.measure(
+            'property_construction', lambda: [Property(**row) for row in rows], items=len(rows))
+        del rows
+
+        sample = properties[:self.process_limit]
+        for grid_size in self.grid_sizes:
+            bounds = GRID_SIZES[grid_size]
+
+            for engine in self.engines:
+                # the cells the engine actually evaluated, bounded and winners skip most of the grid
+                self.measure(
+                    'process[{}/{}]'.format(engine, grid_size),
+                    lambda: [prop.process(*bounds, engine=engine) for prop in sample],
+                    items=len(sample),
+                    permutations=lambda: sum(prop.evaluated_permutations for prop in sample),
+                )
+                if self.sweep_scenarios:
+                    self.measure_sweep(sample, bounds, engine, grid_size)
+
+        to_write = properties[:self.write_limit]
+        for prop in to_write:
+            if not prop.permutation_stats:
+                prop.process(*GRID_SIZES['default'])
+
+        with tempfile.TemporaryDirectory() as output_dir:
+            data = {'properties': to_write}
+            self.measure(
+                'xlsx_write',
+                lambda: XLSXWriter(data, os.path.join(output_dir, 'benchmark.xlsx')).write(),
+                items=len(to_write),
+            )
+            self.measure(
+                'xlsx_write[constant_memory]',
+                lambda: XLSXWriter(data, os.path.join(output_dir, 'benchmark.xlsx'), constant_memory=True).write(),
+                items=len(to_write),
+            )
+
+        return self.report()
+
+    def measure_sweep(self, sample, bounds, engine, grid_size):
+        # a sweep against the same scenarios processed one run at a time, the sweep should win
+        scenarios = [Scenario(name='rate_{}'.format(rate), bank_interest_rate=rate)
+                     for rate in SWEEP_RATES[:self.sweep_scenarios]]
+        label = '{}/{}/{} scenarios'.format(engine, grid_size, len(scenarios))
+
+        # timed for the comparison only, the two stages evaluate the same cells
+        self.measure(
+            'sweep[{}]'.format(label),
+            lambda: [prop.sweep(*bounds, scenarios=scenarios, engine=engine) for prop in sample],
+            items=len(sample),
+        )
+        self.measure(
+            'separate_runs[{}]'.format(label),
+            lambda: [prop.process(*bounds, engine=engine, scenario=scenario)
+                     for scenario in scenarios for prop in sample],
+            items=len(sample),
+        )
+
+    def report(self):
+        return {
+            'input_path': self.input_path,
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'created': time.time(),
+            'stages': self.stages,
+        }
+
+
+def compare(report, baseline):
+    regressions = []
+    for stage, stats in report['stages'].items():
+        try:
+            baseline_seconds = baseline['stages'][stage]['seconds']
+        except KeyError:
+            continue
+
+        ratio = stats['seconds'] / baseline_seconds if baseline_seconds else None
+        stats['baseline_ratio'] = ratio
+        print('{:<48} {:>10.3f}s  x{:.2f} vs baseline'.format(stage, stats['seconds'], ratio or 0.0))
+
+        if ratio is not None and ratio > REGRESSION_THRESHOLD:
+            regressions.append(stage)
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the calculator on a synthetic listing portfolio')
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000], help='e.g. 1000 100000 1000000')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--grid-sizes', nargs='+', default=['default'], choices=sorted(GRID_SIZES))
+    parser.add_argument('--engines', nargs='+', default=['permutation'], choices=sorted(Property.engines))
+    parser.add_argument('--process-limit', type=int, default=1000,
+                        help='number of properties processed per stage, the throughput extrapolates')
+    parser.add_argument('--write-limit', type=int, default=20, help='number of properties written to the workbook')
+    parser.add_argument('--trace-memory', action='store_true', help='record tracemalloc peaks, slows every stage')
+    parser.add_argument('--sweep-scenarios', type=int, default=3, choices=range(len(SWEEP_RATES) + 1),
+                        help='scenarios of the sweep stages, 0 skips them')
+    parser.add_argument('--output', default='benchmark.json')
+    parser.add_argument('--baseline', help='previous benchmark JSON to compare against')
+    args = parser.parse_args()
+
+    reports = {}
+    with tempfile.TemporaryDirectory() as input_dir:
+        for num_rows in args.rows:
+            input_path = os.path.join(input_dir, 'listings_{}.csv'.format(num_rows))
+            generate_listings(input_path, num_rows, args.seed)
+
+            print('=== {} rows ==='.format(num_rows))
+            benchmark = Benchmark(
+                input_path,
+                grid_sizes=args.grid_sizes,
+                engines=args.engines,
+                process_limit=args.process_limit,
+                write_limit=args.write_limit,
+                trace_memory=args.trace_memory,
+                sweep_scenarios=args.sweep_scenarios,
+            )
+            reports[str(num_rows)] = benchmark.run()
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, 'rt') as baseline_file:
+            baseline = json.load(baseline_file)
+
+        for num_rows, report in reports.items():
+            if num_rows in baseline:
+                print('=== {} rows vs baseline ==='.format(num_rows))
+                regressions.extend('{}:{}'.format(num_rows, stage) for stage in compare(report, baseline[num_rows]))
+
+    with open(args.output, 'wt') as output_file:
+        json.dump(reports, output_file, indent=2)
+    print('Wrote benchmark results to {}'.format(args.output))
+
+    if regressions:
+        print('Regressions: {}'.format(', '.join(regressions)))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
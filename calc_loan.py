@@ -1,29 +1,105 @@
 
+import argparse
+import contextlib
 import csv
+import functools
+import itertools
+import os
+import sys
+import time
 
-import xlsxwriter
-
+from amortization import amortization_table
 from constants import *
+from grid_store import GridStore
+from grid_store import GridStoreWriter
+from metrics import NullMetrics
+from metrics import property_metrics
 from property import Property
+from scenario import DEFAULT_SCENARIO
+from scenario import Scenario
+from writers import PermutationCSVWriter
+from writers import PermutationParquetWriter
+from writers import Writer
+
+
+def process_property(prop, engine='permutation', winners_only=False, scenario=None, ranking_query=None,
+                     collect_metrics=False, bounds=DEFAULT_GRID_BOUNDS, horizons=None):
+    if collect_metrics:
+        start = time.perf_counter()
+        hits, misses = amortization_table.counts()
+
+    prop.process(*bounds, engine=engine, scenario=scenario)
+    if collect_metrics:
+        prop.run_metrics = property_metrics(
+            prop, time.perf_counter() - start, amortization_table.hits - hits, amortization_table.misses - misses)
+    if ranking_query is not None:
+        # ranked before the grid is discarded, only the property's top options travel back
+        prop.ranked_options = ranking_query.rank_property(prop)
+    if horizons is not None:
+        prop.process_horizons(horizons)
+    if winners_only:
+        prop.discard_permutation_stats()
+
+    return prop
+
+
+def sweep_property(prop, scenarios, engine='grid', winners_only=True, bounds=DEFAULT_GRID_BOUNDS):
+    prop.sweep(*bounds, scenarios=scenarios, engine=engine, winners_only=winners_only)
+    if winners_only:
+        prop.discard_permutation_stats()
+
+    return prop
+
+
+def simulate_property(indexed_prop, model, engine='permutation', scenario=None, options='winners',
+                      bounds=DEFAULT_GRID_BOUNDS):
+    from permutation_grid import METRICS
+    from simulation import RiskSimulator
+
+    property_index, prop = indexed_prop
+    process_property(prop, engine=engine, scenario=scenario, bounds=bounds)
+
+    if options == 'grid':
+        risk_options = list(prop.permutation_stats.iter_cells()) if prop.permutation_stats else []
+    else:
+        risk_options = []
+        for winner in (prop.max_stats, prop.max_stats_x_years):
+            if winner is None:
+                continue
+            option = (winner.num_years, winner.downpayment_percent, [getattr(winner, name) for name in METRICS])
+            if option[:2] not in [risk_option[:2] for risk_option in risk_options]:
+                risk_options.append(option)
+
+    prop.risk = RiskSimulator(model, scenario).simulate(prop, risk_options, property_index)
+    prop.discard_permutation_stats()
+
+    return prop
 
 
 class LandlordPropertyCalculator(object):
 
-    def __init__(self, input_path, file_format="csv"):
+    def __init__(self, input_path, file_format="csv", metrics=None, bounds=DEFAULT_GRID_BOUNDS):
         self.input_path = input_path
         self.file_format = file_format
+        self.metrics = metrics or NullMetrics()
+        # (min_num_years, max_num_year, min_downpayment_percent, max_downpayment_percent) searched for every property
+        self.bounds = tuple(bounds)
 
         self.global_max_roi = MINIMUM_DECIMAL
         self.global_max_stats = None
 
+        self.malformed_rows = []
+
 
     def read_csv_input(self, input_path):
+        return list(self.iter_csv_input(input_path))
+
+    def iter_csv_input(self, input_path):
         with open(input_path, 'rt') as input_file:
             reader = csv.DictReader(input_file)
 
-            return [
-                row for row in reader
-            ]
+            for row in reader:
+                yield row
 
     def read_input(self):
         try:
@@ -40,48 +116,376 @@ class LandlordPropertyCalculator(object):
 
         return available_properties
 
-    def process(self):
+    def iter_input(self):
+        try:
+            reader = self.readers[self.file_format]
+        except KeyError:
+            print('Input file format "{}" not supported. Supported formats are: {}'.format(
+                self.file_format, self.readers.keys()))
+            return
+
+        # the header is line 1
+        for line_number, row in enumerate(reader(self, self.input_path), start=2):
+            try:
+                prop = Property(**row)
+                prop.check_listing()
+            except (TypeError, ValueError) as e:
+                self.metrics.count('malformed_rows')
+                self.malformed_rows.append((line_number, str(e)))
+                print('Skipping malformed row {}: {}'.format(line_number, e))
+                continue
+
+            yield prop
+
+    def process_stream(self, engine='permutation', workers=1, chunk_size=DEFAULT_CHUNK_SIZE, winners_only=True,
+                       scenario=None, cache=None, ranking=None, horizons=None):
+        self.check_ranking(ranking, cache, engine)
+        self.check_horizons(horizons, cache, engine)
+        if self.file_format == 'store':
+            # grids of an earlier run, nothing is recomputed
+            for prop in self.iter_stored(winners_only, ranking, horizons, scenario):
+                yield prop
+            return
+
+        self.precompute_amortization([scenario or DEFAULT_SCENARIO])
+
+        for prop in self.iter_cached(self.iter_input(), cache, engine, workers, chunk_size, winners_only, scenario,
+                                     ranking, horizons):
+            self.merge_result(prop, ranking)
+            yield prop
+
+    def process(self, engine='permutation', workers=1, chunk_size=DEFAULT_CHUNK_SIZE, winners_only=False,
+                scenario=None, cache=None, ranking=None):
+        self.check_ranking(ranking, cache, engine)
+
+        with self.metrics.stage('read_input'):
+            available_properties = self.read_input()
 
-        available_properties = self.read_input()
         if not available_properties:
             print('No input to process!')
             return
 
         print('Processing {} properties'.format(len(available_properties)))
 
-        for prop in available_properties:
-            # TODO - read data from input
-            prop.process(
-                min_num_years=1,
-                max_num_year=30,
-                min_downpayment_percent=20,
-                max_downpayment_percent=100,
-            )
-            if prop.max_roi > self.global_max_roi:
-                self.global_max_roi = prop.max_roi
-                self.global_max_stats = prop.max_stats
+        with self.metrics.stage('precompute_amortization'):
+            self.precompute_amortization([scenario or DEFAULT_SCENARIO])
+
+        processed_properties = []
+        with self.metrics.stage('process'):
+            for prop in self.iter_cached(available_properties, cache, engine, workers, chunk_size, winners_only,
+                                         scenario, ranking):
+                self.merge_result(prop, ranking)
+                processed_properties.append(prop)
+
+        if ranking is not None:
+            with self.metrics.stage('ranking'):
+                ranking_results = ranking.results()
+        else:
+            ranking_results = None
 
         return {
-            'properties': available_properties,
+            'properties': processed_properties,
             'global_max_stats': self.global_max_stats,
             'global_max_roi': self.global_max_roi,
+            'ranking': ranking_results,
+            'metrics': self.metrics.as_dict(),
+        }
+
+    def sweep(self, scenarios, engine='grid', workers=1, chunk_size=DEFAULT_CHUNK_SIZE, winners_only=True):
+
+        available_properties = self.read_input()
+        if not available_properties:
+            print('No input to process!')
+            return
+
+        print('Sweeping {} properties over {} scenarios'.format(len(available_properties), len(scenarios)))
+
+        scenario_summaries = [
+            {
+                'scenario': scenario,
+                'global_max_stats': None,
+                'global_max_roi': MINIMUM_DECIMAL,
+            } for scenario in scenarios
+        ]
+
+        self.precompute_amortization(scenarios)
+
+        sweep = functools.partial(
+            sweep_property, scenarios=scenarios, engine=engine, winners_only=winners_only, bounds=self.bounds)
+
+        processed_properties = []
+        for prop in self.iter_mapped(sweep, available_properties, workers, chunk_size):
+            for summary, result in zip(scenario_summaries, prop.scenario_results):
+                if result.max_roi > summary['global_max_roi']:
+                    summary['global_max_roi'] = result.max_roi
+                    summary['global_max_stats'] = result.max_stats
+            processed_properties.append(prop)
+
+        return {
+            'properties': processed_properties,
+            'scenarios': scenario_summaries,
         }
 
+    def simulate(self, model, engine='permutation', workers=1, chunk_size=DEFAULT_CHUNK_SIZE, scenario=None,
+                 options='winners'):
+        if options == 'grid':
+            self.check_grid_engine(engine, 'Simulating every option')
+        if engine in Property.resolutions:
+            raise ValueError('The risk simulation steps whole years, the {} engine finds terms in months'.format(engine))
+
+        available_properties = self.read_input()
+        if not available_properties:
+            print('No input to process!')
+            return
+
+        print('Simulating {} properties over {} paths'.format(len(available_properties), model.num_paths))
+
+        self.precompute_amortization([scenario or DEFAULT_SCENARIO])
+
+        simulate = functools.partial(
+            simulate_property, model=model, engine=engine, scenario=scenario, options=options, bounds=self.bounds)
+
+        processed_properties = []
+        with self.metrics.stage('simulate'):
+            for prop in self.iter_mapped(simulate, enumerate(available_properties), workers, chunk_size):
+                self.merge_result(prop)
+                processed_properties.append(prop)
+
+        return {
+            'properties': processed_properties,
+            'global_max_stats': self.global_max_stats,
+            'global_max_roi': self.global_max_roi,
+        }
+
+    def sensitivity(self, model=None, scenario=None):
+        from sensitivity import SensitivityAnalysis
+
+        if self.file_format == 'store':
+            raise ValueError('Sensitivity needs the listings, a store only keeps the grids of one scenario')
+
+        analysis = SensitivityAnalysis(model, scenario)
+        self.precompute_amortization([analysis.scenario])
+
+        # whole batches go through numpy at once, a worker pool has nothing left to split
+        processed_properties = []
+        properties = self.iter_input()
+        with self.metrics.stage('sensitivity'):
+            while True:
+                batch = list(itertools.islice(properties, analysis.model.batch_size))
+                if not batch:
+                    break
+
+                for prop in analysis.analyze(batch, self.bounds):
+                    self.merge_result(prop)
+                    processed_properties.append(prop)
+
+        return {
+            'properties': processed_properties,
+            'global_max_stats': self.global_max_stats,
+            'global_max_roi': self.global_max_roi,
+        }
+
+    def iter_stored(self, winners_only=True, ranking=None, horizons=None, scenario=None):
+        with GridStore(self.input_path) as store:
+            self.check_store(store, scenario)
+            print('Reading {} stored properties from {}'.format(len(store), self.input_path))
+
+            for prop in store:
+                if ranking is not None:
+                    prop.ranked_options = ranking.query.rank_property(prop)
+                if horizons is not None:
+                    prop.process_horizons(horizons)
+                if winners_only:
+                    prop.discard_permutation_stats()
+
+                self.merge_result(prop, ranking)
+                yield prop
+
+    def iter_processed(self, properties, engine='permutation', workers=1, chunk_size=DEFAULT_CHUNK_SIZE,
+                       winners_only=False, scenario=None, ranking=None, horizons=None, pool=None):
+        process = functools.partial(
+            process_property, engine=engine, winners_only=winners_only, scenario=scenario,
+            ranking_query=ranking.query if ranking is not None else None,
+            collect_metrics=self.metrics.enabled,
+            bounds=self.bounds,
+            horizons=horizons,
+        )
+        return self.iter_mapped(process, properties, workers, chunk_size, pool)
+
+    def iter_cached(self, properties, cache=None, engine='permutation', workers=1, chunk_size=DEFAULT_CHUNK_SIZE,
+                    winners_only=False, scenario=None, ranking=None, horizons=None):
+        if cache is None:
+            for prop in self.iter_processed(properties, engine, workers, chunk_size, winners_only, scenario, ranking,
+                                            horizons):
+                yield prop
+            return
+
+        # cached properties come back with their winners only, the rest are computed and stored.
+        # Batches keep the output in input order without holding a streamed input in memory, and
+        # every batch's misses go to the same pool.
+        batch_size = chunk_size * (workers or os.cpu_count())
+        resolution = Property.resolutions.get(engine)
+        properties = iter(properties)
+
+        with self.create_pool(workers) as pool:
+            while True:
+                batch = list(itertools.islice(properties, batch_size))
+                if not batch:
+                    break
+
+                cached = [cache.load(prop, scenario, self.bounds, resolution) for prop in batch]
+                computed = self.iter_processed(
+                    [prop for prop, hit in zip(batch, cached) if not hit],
+                    engine, workers, chunk_size, winners_only, scenario, pool=pool,
+                )
+
+                self.metrics.count('cached_properties', sum(cached))
+
+                for prop, hit in zip(batch, cached):
+                    if not hit:
+                        prop = next(computed)
+                        cache.store(prop, scenario, self.bounds, resolution)
+                    yield prop
+
+                cache.commit()
+
+    def iter_mapped(self, process, properties, workers=1, chunk_size=DEFAULT_CHUNK_SIZE, pool=None):
+        if workers == 1:
+            for prop in properties:
+                yield process(prop)
+            return
+
+        if pool is None:
+            with self.create_pool(workers) as pool:
+                for prop in self.iter_mapped(process, properties, workers, chunk_size, pool):
+                    yield prop
+            return
+
+        # imap keeps the input order, so merging stays deterministic whatever the worker count.
+        # The pool's feeder thread drains whatever iterable it is given, so hand it one batch
+        # at a time to keep memory bounded on streamed input.
+        batch_size = chunk_size * (workers or os.cpu_count())
+        properties = iter(properties)
+
+        while True:
+            batch = list(itertools.islice(properties, batch_size))
+            if not batch:
+                break
+
+            for prop in pool.imap(process, batch, chunksize=chunk_size):
+                yield prop
+
+    def create_pool(self, workers):
+        # a context manager either way, with no pool to start for a single worker
+        if workers == 1:
+            return contextlib.nullcontext()
+
+        # only pulled in when there is a pool to start, it adds to the start-up of every run
+        import multiprocessing
+        return multiprocessing.Pool(processes=workers)
+
+    def precompute_amortization(self, scenarios):
+        # filled before the pool forks, so worker processes start with a warm table
+        hits, misses = amortization_table.counts()
+        for scenario in scenarios:
+            amortization_table.precompute(scenario.monthly_interest_rate, self.bounds[0], self.bounds[1])
+        self.metrics.count('amortization_hits', amortization_table.hits - hits)
+        self.metrics.count('amortization_misses', amortization_table.misses - misses)
+
+    def check_ranking(self, ranking, cache, engine='permutation'):
+        if ranking is None:
+            return
+        if cache is not None:
+            raise ValueError('Ranking needs the permutation grids, which cached properties no longer have')
+        self.check_grid_engine(engine, 'Ranking')
+
+    def check_grid_engine(self, engine, needs):
+        # a store brings its own grids whatever the engine
+        if self.file_format != 'store' and engine not in Property.grid_engines:
+            raise ValueError('{} needs the permutation grids, the {} engine keeps none. Use one of: {}'.format(
+                needs, engine, ', '.join(Property.grid_engines)))
+
+    def check_store(self, store, scenario=None):
+        # the grids were computed for the store's own scenario and bounds. Left at their defaults the
+        # options take the store's, anything else would be silently ignored, so it has to match.
+        scenario = scenario or DEFAULT_SCENARIO
+        if store.scenario is not None and scenario != DEFAULT_SCENARIO and scenario != store.scenario:
+            raise ValueError('{} was computed for {} {}, not for {} {}. Export it again for that scenario'.format(
+                self.input_path, store.scenario.name, store.scenario.key(), scenario.name, scenario.key()))
+        if tuple(self.bounds) != DEFAULT_GRID_BOUNDS and tuple(self.bounds) != store.bounds:
+            raise ValueError('{} was computed over the grid {}, not {}. Export it again for that grid'.format(
+                self.input_path, store.bounds, tuple(self.bounds)))
+
+    def check_horizons(self, horizons, cache, engine='permutation'):
+        if horizons is None:
+            return
+        if cache is not None:
+            raise ValueError('Horizons need the permutation grids, which cached properties no longer have')
+        self.check_grid_engine(engine, 'Horizons')
+
+    def merge_result(self, prop, ranking=None):
+        if prop.max_roi > self.global_max_roi:
+            self.global_max_roi = prop.max_roi
+            self.global_max_stats = prop.max_stats
+
+        if ranking is not None:
+            ranking.add_options(prop.ranked_options)
+            prop.ranked_options = []
+
+        self.metrics.add_property(prop)
+
+
+    def export(self, output_file_path, output_format='csv', engine='permutation', workers=1,
+               chunk_size=DEFAULT_CHUNK_SIZE, scenario=None, **writer_options):
+        try:
+            writer_class = self.writers[output_format]
+        except KeyError:
+            print('Output format "{}" not supported. Supported formats are: {}'.format(
+                output_format, self.writers.keys()))
+            return False
+
+        self.check_grid_engine(engine, 'Export')
+        writer = writer_class(output_file_path=output_file_path, metrics=self.metrics, **writer_options)
+
+        writer.open()
+        try:
+            with self.metrics.stage('export'):
+                for prop in self.process_stream(engine, workers, chunk_size, winners_only=False,
+                                                scenario=scenario):
+                    writer.write_property(prop)
+                    # written, so the grid can go before the next property arrives
+                    prop.discard_permutation_stats()
+            writer.finish()
+        finally:
+            writer.close()
+
+        print('Wrote results to {}'.format(output_file_path))
+        return True
 
     readers = {
-        'csv': read_csv_input,
+        'csv': iter_csv_input,
     }
 
 
-class XLSXWriter(object):
+class XLSXWriter(Writer):
 
-    def __init__(self, data, output_file_path='output.xlsx'):
-        self.data = data
-        self.output_file_path = output_file_path
+    # number of shades per colour channel, which bounds the workbook to roi_color_buckets ** 2 cell formats
+    roi_color_buckets = 16
 
-    def write(self):
-        self.workbook = xlsxwriter.Workbook(self.output_file_path)
+    property_stage = 'xlsx_property_sheets'
 
+    def __init__(self, data=None, output_file_path='output.xlsx', constant_memory=False, metrics=None):
+        super(XLSXWriter, self).__init__(data, output_file_path, metrics)
+        self.constant_memory = constant_memory
+
+    def open(self):
+        # imported here so runs that never write a workbook don't pay for it
+        import xlsxwriter
+
+        # constant_memory flushes each row once the next one starts, so every sheet is written top to bottom
+        self.workbook = xlsxwriter.Workbook(self.output_file_path, {'constant_memory': self.constant_memory})
+
+        self.cell_formats = {}
         self.formats = {
             'bold': self.workbook.add_format({'bold': True, 'align': 'center'}),
             'center': self.create_center_format(),
@@ -89,19 +493,19 @@ class XLSXWriter(object):
             'vcenter_wrapped': self.create_vcenter_wrapped_format(),
             'header_blue': self.create_header_blue_format(),
             'header_lime': self.create_header_lime_format(),
+            'rotated': self.create_rotated_format(),
+            'title_silver': self.get_cell_format(bg_color='silver', border=0),
         }
 
-        try:
+        with self.metrics.stage('xlsx_summary'):
             self.write_summary_sheet()
 
-            for prop in self.data['properties']:
-                self.write_prop_worksheet(prop)
+    def write_property(self, prop):
+        self.write_prop_worksheet(prop)
+        self.metrics.count('xlsx_sheets')
 
-        except Exception as e:
-            raise
-        else:
-            print('Wrote results to {}'.format(self.output_file_path))
-        finally:
+    def close(self):
+        with self.metrics.stage('xlsx_close'):
             self.workbook.close()
 
     def create_center_wrapped_format(self):
@@ -138,6 +542,24 @@ class XLSXWriter(object):
         header_yellow.set_border(1)
         return header_yellow
 
+    def get_cell_format(self, bg_color=None, font_color=None, border=1):
+        key = (bg_color, font_color, border)
+        try:
+            return self.cell_formats[key]
+        except KeyError:
+            pass
+
+        cell_format = self.create_vcenter_wrapped_format()
+        if bg_color:
+            cell_format.set_bg_color(bg_color)
+        if font_color:
+            cell_format.set_font_color(font_color)
+        if border:
+            cell_format.set_border(border)
+
+        self.cell_formats[key] = cell_format
+        return cell_format
+
     def create_center_format(self):
         center = self.workbook.add_format()
         self.centralize_format(center)
@@ -175,20 +597,31 @@ class XLSXWriter(object):
         header_row = row = 50
         header_col = col = 3
 
-        rotated_format = self.create_rotated_format()
-        worksheet.merge_range('C28:D29', 'Year vs.\nDownpayment', rotated_format)
-
         header_lime_format = self.formats['header_lime']
-        for num_years_stats in prop.permutation_stats.items():
+        permutation_stats = list(prop.permutation_stats.items())
+
+        # rows are downpayment prefixes cut at the max downpayment, the longest one spans the header
+        downpayment_percents = max([list(num_years_stats) for _, num_years_stats in permutation_stats] or [[]], key=len)
+
+        worksheet.write(header_row, header_col, 'Year vs.\nDownpayment', self.formats['rotated'])
+        for downpayment_percent in downpayment_percents:
+            col += 1
+            worksheet.write_number(header_row, col, downpayment_percent, header_lime_format)
+
+        if downpayment_percents:
+            worksheet.set_column(header_col + 1, col, 55)
+
+        for num_years, num_years_stats in permutation_stats:
             row += 1
             col = header_col
 
-            worksheet.write_number(row, header_col, num_years_stats[0], header_lime_format)
+            worksheet.write_number(row, header_col, num_years, header_lime_format)
 
-            for perm in num_years_stats[1].items():
+            for perm in num_years_stats.values():
                 col += 1
-                worksheet.write_number(header_row, col, perm[0], header_lime_format)
-                self.write_permutation(perm[1], worksheet, row, col)
+                self.write_permutation(perm, worksheet, row, col)
+
+            self.metrics.count('xlsx_permutation_cells', col - header_col)
 
     def write_prop_basics_header(self, prop, worksheet):
 
@@ -228,9 +661,7 @@ class XLSXWriter(object):
         worksheet.write_number('L4', prop.annual_rent, center_wrapped)
 
     def write_prop_winner_roi(self, prop, worksheet):
-        title_format = self.create_vcenter_wrapped_format()
-        title_format.set_bg_color('silver')
-        # title_format.set_font_color(colors['font'])
+        title_format = self.formats['title_silver']
         worksheet.merge_range(
             'B7:E7',
             'WINNER Immediate ROI   -->   Annual ROI: {:.2f}%'.format(
@@ -242,13 +673,11 @@ class XLSXWriter(object):
         worksheet.merge_range('B8:E25', str(prop.max_stats), self.formats['vcenter_wrapped'])
 
     def write_prop_winner_roi_x_years(self, prop, worksheet):
-        title_format = self.create_vcenter_wrapped_format()
-        title_format.set_bg_color('silver')
-        # title_format.set_font_color(colors['font'])
+        title_format = self.formats['title_silver']
         worksheet.merge_range(
             'B28:E28',
             'WINNER X-Years ROI   -->   Annual ROI: {:.2f}%'.format(
-                prop.max_stats_x_years.x_years_avg_annual_roi * 100.00,
+                prop.max_roi_x_years * 100.00,
             ),
             title_format,
         )
@@ -258,9 +687,6 @@ class XLSXWriter(object):
 
     def write_permutation(self, permutation, worksheet, cell_row, cell_col):
 
-        worksheet.set_column(cell_row, cell_col, 55)
-        cell_format = self.create_vcenter_wrapped_format()
-
         try:
             content = '----> Immediate Annual ROI: {:.2f}%  X-Years ROI: {:.2f}% <----\n{}'.format(
                 permutation.annual_ROI * 100.00,
@@ -269,13 +695,10 @@ class XLSXWriter(object):
             )
         except AttributeError:
             content = str(permutation)
+            cell_format = self.get_cell_format()
         else:
-            color = self.get_roi_color(permutation)
-            cell_format.set_bg_color(color)
-            cell_format.set_font_color('white')
-            # cell_format.set_border_color(colors['font'])
-        
-        cell_format.set_border(1)
+            cell_format = self.get_cell_format(bg_color=self.get_roi_color(permutation), font_color='white')
+
         worksheet.write(cell_row, cell_col, content, cell_format)
 
     def get_roi_color(self, permutation):
@@ -294,17 +717,347 @@ class XLSXWriter(object):
         red = min(max(int(((range_roi - immediate_ROI)/range_roi) * range_rgb), 0), 255)
         green = min(max(int((x_years_ROI/range_roi) * range_rgb), 0), 255)
 
-        return '#%02x%02x%02x' % (red, green, 0)
+        return '#%02x%02x%02x' % (self.quantize_color(red), self.quantize_color(green), 0)
+
+    def quantize_color(self, channel):
+        bucket = channel * self.roi_color_buckets // 256
+        return int(bucket * 255 / (self.roi_color_buckets - 1))
+
+
+# XLSXWriter is defined after the calculator, so the registry is filled in here. Every entry is a writers.Writer
+LandlordPropertyCalculator.writers = {
+    'xlsx': XLSXWriter,
+    'csv': PermutationCSVWriter,
+    'parquet': PermutationParquetWriter,
+    'store': GridStoreWriter,
+}
+
+
+def add_input_arguments(parser, engines=None, engine_options=True):
+    # engine_options=False for commands with their own evaluation, which read listings only
+    if not engine_options:
+        parser.add_argument('input_path', help='property listings, one row per property')
+        parser.add_argument('--input-format', choices=sorted(LandlordPropertyCalculator.readers))
+    else:
+        parser.add_argument('input_path', help='property listings, one row per property, or a store from export')
+        parser.add_argument('--input-format', choices=sorted(LandlordPropertyCalculator.readers) + ['store'],
+                            help='defaults to store for a store directory and csv otherwise')
+        parser.add_argument('--engine', default='permutation', choices=sorted(engines or Property.engines))
+        parser.add_argument('--workers', type=int, default=1, help='worker processes, 0 for one per CPU')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+
+    grid = parser.add_argument_group('search grid')
+    grid.add_argument('--min-years', type=int, default=MIN_NUM_YEARS)
+    grid.add_argument('--max-years', type=int, default=MAX_NUM_YEARS)
+    grid.add_argument('--min-downpayment', type=int, default=MIN_DOWNPAYMENT_PERCENT, help='percent')
+    grid.add_argument('--max-downpayment', type=int, default=MAX_DOWNPAYMENT_PERCENT, help='percent')
+
+    bank = parser.add_argument_group('bank')
+    bank.add_argument('--interest-rate', type=float, default=BANK_INTEREST_RATE, help='annual, percent')
+    bank.add_argument('--loan-giving-fee', type=float, default=BANK_LOAN_GIVING_FEE)
+    bank.add_argument('--mortgage-fee', type=float, default=BANK_MORTGAGE_FEE)
+    bank.add_argument('--loan-stamps', type=float, default=BANK_LOAN_STAMPS)
+    bank.add_argument('--max-downpayment-amount', type=float, default=MAX_DOWNPAYMENT)
+    bank.add_argument('--max-monthly-installment', type=float, default=MAX_MONTHLY_INSTALLMENT)
+    bank.add_argument('--minimum-loan-principal', type=float, default=MINIMUM_LOAN_PRINCIPAL)
+
+    parser.add_argument('--metrics', help='write stage timings and counters to this JSON file')
+    parser.add_argument('--profile', help='write a cProfile dump to this file, use with --workers 1')
+
+
+def check_input_arguments(parser, args):
+    # everything the engines divide by, caught before any listing is read
+    if args.min_years < 1:
+        parser.error('--min-years must be at least 1, got {}'.format(args.min_years))
+    if args.min_years > args.max_years:
+        parser.error('--min-years {} is above --max-years {}'.format(args.min_years, args.max_years))
+    for name in ('min_downpayment', 'max_downpayment'):
+        if not 1 <= getattr(args, name) <= 100:
+            parser.error('--{} must be a percent from 1 to 100, got {}'.format(
+                name.replace('_', '-'), getattr(args, name)))
+    if args.min_downpayment > args.max_downpayment:
+        parser.error('--min-downpayment {} is above --max-downpayment {}'.format(
+            args.min_downpayment, args.max_downpayment))
+    if not args.interest_rate > 0:
+        parser.error('--interest-rate must be positive, got {}'.format(args.interest_rate))
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Compare financing options to maximize ROI')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    compute = commands.add_parser('compute', help='print the winners of every property')
+    add_input_arguments(compute)
+    compute.add_argument('--cache', nargs='?', const=RESULT_CACHE_PATH,
+                         help='reuse winners from earlier runs, kept in this sqlite file')
+    compute.add_argument('--clear-cache', action='store_true',
+                         help='drop every cached winner before the run, implies --cache')
+    compute.add_argument('--prune-cache', type=float, metavar='DAYS',
+                         help='drop winners of older calculation versions and those unused for DAYS days, '
+                              'implies --cache')
+
+    export = commands.add_parser('export', help='write every evaluated option to a file')
+    add_input_arguments(export, Property.grid_engines)
+    export.add_argument('output_path')
+    export.add_argument('--output-format', choices=sorted(LandlordPropertyCalculator.writers),
+                        help='defaults to the output file extension')
+    export.add_argument('--constant-memory', action='store_true', help='xlsx only, write rows as they come')
+
+    rank = commands.add_parser('rank', help='print the best options across all properties')
+    add_input_arguments(rank, Property.grid_engines)
+    rank.add_argument('--top-k', type=int, default=50)
+    rank.add_argument('--rank-by', default='immediate', choices=('immediate', 'x_years', 'afterloan'))
+    rank.add_argument('--max-equity', type=float)
+    rank.add_argument('--max-option-installment', type=float, help='skip options paying more per month')
+    rank.add_argument('--min-area', type=float)
+    rank.add_argument('--max-area', type=float)
+
+    frontier = commands.add_parser('frontier', help='print the options trading equity against immediate and x-years ROI')
+    add_input_arguments(frontier, Property.grid_engines)
+    frontier.add_argument('--per-property', action='store_true', help="each property's own frontier")
+    frontier.add_argument('--max-equity', type=float)
+    frontier.add_argument('--max-option-installment', type=float, help='skip options paying more per month')
+    frontier.add_argument('--min-area', type=float)
+    frontier.add_argument('--max-area', type=float)
+
+    allocate = commands.add_parser('allocate', help='spread one equity budget over at most one option per property')
+    add_input_arguments(allocate, Property.grid_engines)
+    allocate.add_argument('--budget', type=float, required=True, help='total equity to spend')
+    allocate.add_argument('--equity-step', type=float, default=ALLOCATION_EQUITY_STEP,
+                          help='equity is allocated in whole steps, option equity rounds up')
+    allocate.add_argument('--objective', default='immediate', choices=('immediate', 'x_years'),
+                          help='annual income to maximise')
+    allocate.add_argument('--max-option-installment', type=float, help='skip options paying more per month')
+    allocate.add_argument('--min-area', type=float)
+    allocate.add_argument('--max-area', type=float)
+
+    sensitivity = commands.add_parser('sensitivity', help="how each property's winner moves with rent, price and rate")
+    add_input_arguments(sensitivity, engine_options=False)
+    sensitivity.add_argument('--rent-change', type=float, default=-0.05, help='relative, -0.05 for 5%% less rent')
+    sensitivity.add_argument('--price-change', type=float, default=0.03, help='relative')
+    sensitivity.add_argument('--rate-change', type=float, default=1.0, help='points, applied up and down')
+    sensitivity.add_argument('--batch-size', type=int, default=128, help='properties evaluated together')
+
+    horizons = commands.add_parser('horizons', help='print the x-years winner of every period')
+    add_input_arguments(horizons, Property.grid_engines)
+    horizons.add_argument('--min-horizon', type=int, default=MIN_HORIZON_YEARS, help='years')
+    horizons.add_argument('--max-horizon', type=int, default=MAX_HORIZON_YEARS, help='years')
+
+    return parser
+
+
+def run_compute(calculator, scenario, args):
+    cache = None
+    if args.cache or args.clear_cache or args.prune_cache is not None:
+        from result_cache import ResultCache
+        cache = ResultCache(args.cache or RESULT_CACHE_PATH)
+
+        if args.clear_cache:
+            cache.invalidate()
+        if args.prune_cache is not None:
+            print('Pruned {} cached results'.format(cache.prune(args.prune_cache)))
+
+    try:
+        for prop in calculator.process_stream(args.engine, args.workers or None, args.chunk_size, winners_only=True,
+                                              scenario=scenario, cache=cache):
+            print('{}\n  immediate: {}\n  x-years:   {}'.format(
+                prop.name, format_winner(prop.max_stats, prop.max_roi),
+                format_winner(prop.max_stats_x_years, prop.max_roi_x_years)))
+    finally:
+        if cache is not None:
+            cache.close()
+
+    if calculator.global_max_stats is not None:
+        print('Best immediate ROI: {} {}'.format(
+            calculator.global_max_stats.parent_prop.name,
+            format_winner(calculator.global_max_stats, calculator.global_max_roi)))
+    return 0
+
+
+def run_export(calculator, scenario, args):
+    output_format = args.output_format or os.path.splitext(args.output_path)[1].lstrip('.').lower()
+    writer_options = {}
+    if args.constant_memory and output_format == 'xlsx':
+        writer_options['constant_memory'] = True
+    if output_format == 'store':
+        writer_options['bounds'] = calculator.bounds
+
+    exported = calculator.export(args.output_path, output_format, args.engine, args.workers or None, args.chunk_size,
+                                 scenario, **writer_options)
+    return 0 if exported else 1
+
+
+def run_rank(calculator, scenario, args):
+    from ranking import RankingQuery
+    from ranking import TopKRanking
+
+    ranking = TopKRanking(RankingQuery(
+        top_k=args.top_k,
+        rank_by=args.rank_by,
+        max_equity=args.max_equity,
+        max_monthly_installment=args.max_option_installment,
+        min_area=args.min_area,
+        max_area=args.max_area,
+    ))
+    for _ in calculator.process_stream(args.engine, args.workers or None, args.chunk_size, winners_only=True,
+                                       scenario=scenario, ranking=ranking):
+        pass
+
+    for position, option in enumerate(ranking.results(), start=1):
+        print('{:>4}. {}'.format(position, option))
+    return 0
+
+
+def run_frontier(calculator, scenario, args):
+    from frontier import FrontierQuery
+    from frontier import ParetoFrontier
+
+    frontier = ParetoFrontier(FrontierQuery(
+        max_equity=args.max_equity,
+        max_monthly_installment=args.max_option_installment,
+        min_area=args.min_area,
+        max_area=args.max_area,
+    ), per_property=args.per_property)
+    for _ in calculator.process_stream(args.engine, args.workers or None, args.chunk_size, winners_only=True,
+                                       scenario=scenario, ranking=frontier):
+        pass
+
+    for option in frontier.results():
+        print('{} | num_years: {} | downpayment_percent: {}% | equity: {:.2f} | immediate: {:.2f}% | x-years: {:.2f}%'.format(
+            option.prop.name, option.num_years, option.downpayment_percent, option.equity,
+            option.annual_ROI * 100.00, option.x_years_avg_annual_roi * 100.00))
+    return 0
+
+
+def run_allocate(calculator, scenario, args):
+    from allocation import AllocationQuery
+    from allocation import CapitalAllocation
+
+    allocation = CapitalAllocation(AllocationQuery(
+        equity_step=args.equity_step,
+        objective=args.objective,
+        max_monthly_installment=args.max_option_installment,
+        min_area=args.min_area,
+        max_area=args.max_area,
+    ), args.budget)
+    for _ in calculator.process_stream(args.engine, args.workers or None, args.chunk_size, winners_only=True,
+                                       scenario=scenario, ranking=allocation):
+        pass
+
+    options = allocation.results()
+    for option in options:
+        print('{} | num_years: {} | downpayment_percent: {}% | equity: {:.2f} | income: {:.2f}'.format(
+            option.prop.name, option.num_years, option.downpayment_percent, option.equity, option.score))
+    print('{} properties, equity {:.2f} of {:.2f}, annual income {:.2f}'.format(
+        len(options), sum(option.equity for option in options), args.budget, allocation.total_income))
+    return 0
+
+
+def run_sensitivity(calculator, scenario, args):
+    from sensitivity import PERTURBATIONS
+    from sensitivity import SensitivityModel
+
+    result = calculator.sensitivity(SensitivityModel(
+        rent_change=args.rent_change,
+        price_change=args.price_change,
+        rate_change=args.rate_change,
+        batch_size=args.batch_size,
+    ), scenario)
+
+    for prop in result['properties']:
+        print('{}\n  immediate: {}'.format(prop.name, format_winner(prop.max_stats, prop.max_roi)))
+        sensitivity = prop.sensitivity
+        if sensitivity is None:
+            continue
+
+        # finite differences of the ROI, in percentage points, not rates of change
+        for name in PERTURBATIONS:
+            change = sensitivity.roi_change(name)
+            print('  {:<10} {:>12} at the same cell{}'.format(
+                name, 'infeasible' if change is None else '{:+.2f} points'.format(change * 100.00),
+                ', winner moves to {}'.format(sensitivity.winners[name]) if sensitivity.winner_changed(name) else ''))
+        print('  break-even rent: {}'.format(
+            'unknown' if sensitivity.break_even_rent is None else '{:.2f}'.format(sensitivity.break_even_rent)))
+    return 0
+
+
+def run_horizons(calculator, scenario, args):
+    horizons = range(args.min_horizon, args.max_horizon + 1)
+
+    for prop in calculator.process_stream(args.engine, args.workers or None, args.chunk_size, winners_only=True,
+                                          scenario=scenario, horizons=horizons):
+        print(prop.name)
+        for horizon in horizons:
+            print('  {:>3} years: {}'.format(horizon, format_winner(
+                prop.max_stats_by_horizon[horizon], prop.max_roi_by_horizon[horizon])))
+    return 0
+
+
+def format_winner(permutation, roi):
+    if permutation is None:
+        return 'no feasible option'
+    if permutation.num_years == int(permutation.num_years):
+        term = '{} years'.format(int(permutation.num_years))
+    else:
+        term = '{} months'.format(round(permutation.num_years * MONTHS))
+    return '{:.2f}% at {}, {:g}% down'.format(roi * 100.00, term, permutation.downpayment_percent)
+
+
+commands = {
+    'compute': run_compute,
+    'export': run_export,
+    'rank': run_rank,
+    'frontier': run_frontier,
+    'allocate': run_allocate,
+    'sensitivity': run_sensitivity,
+    'horizons': run_horizons,
+}
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    check_input_arguments(parser, args)
+
+    if args.metrics or args.profile:
+        from metrics import RunMetrics
+        metrics = RunMetrics(profile_path=args.profile)
+    else:
+        metrics = None
+
+    scenario = Scenario(
+        bank_interest_rate=args.interest_rate,
+        bank_loan_giving_fee=args.loan_giving_fee,
+        bank_mortgage_fee=args.mortgage_fee,
+        bank_loan_stamps=args.loan_stamps,
+        max_downpayment=args.max_downpayment_amount,
+        max_monthly_installment=args.max_monthly_installment,
+        minimum_loan_principal=args.minimum_loan_principal,
+    )
+    if scenario == DEFAULT_SCENARIO:
+        scenario = DEFAULT_SCENARIO
+
+    input_format = args.input_format or ('store' if GridStore.is_store(args.input_path) else 'csv')
+
+    calculator = LandlordPropertyCalculator(
+        args.input_path, input_format, metrics,
+        bounds=(args.min_years, args.max_years, args.min_downpayment, args.max_downpayment),
+    )
+
+    try:
+        with calculator.metrics.profile():
+            status = commands[args.command](calculator, scenario, args)
+    except ValueError as e:
+        # the checks on engines, stores and horizons, a message is enough
+        print('Error: {}'.format(e), file=sys.stderr)
+        return 1
+
+    if args.metrics:
+        calculator.metrics.to_json(args.metrics)
+        print('Amortization table: {hits} hits, {misses} misses, {hit_rate:.1%} hit rate'.format(
+            **calculator.metrics.amortization_stats()))
+    return status
 
 
 if __name__ == '__main__':
-
-    # TODO - read user input
-
-    calculator = LandlordPropertyCalculator('/Users/malhyari/Downloads/PropertyOptions - Sheet1.csv', 'csv')
-    results = calculator.process()
-
-    writer = XLSXWriter(results)
-    writer.write()
-
-
+    sys.exit(main())
@@ -0,0 +1 @@
+# the modules sit at the top of the repository, tests/ imports them from here
@@ -16,3 +16,34 @@ BANK_LOAN_STAMPS = 0 # 0.003
 MINIMUM_LOAN_PRINCIPAL = 5000
 
 VISUALIZING_ROI_YEARS = 10
+
+# x-years ROI periods covered by Property.process_horizons
+MIN_HORIZON_YEARS = 1
+MAX_HORIZON_YEARS = 40
+
+# SEARCH GRID
+MIN_NUM_YEARS = 1
+MAX_NUM_YEARS = 30
+MIN_DOWNPAYMENT_PERCENT = 20
+MAX_DOWNPAYMENT_PERCENT = 100
+DEFAULT_GRID_BOUNDS = (MIN_NUM_YEARS, MAX_NUM_YEARS, MIN_DOWNPAYMENT_PERCENT, MAX_DOWNPAYMENT_PERCENT)
+
+# resolution of the adaptive engine, terms in steps of months and downpayments in steps of
+# 1 / ADAPTIVE_DOWNPAYMENT_RESOLUTION percent
+ADAPTIVE_MONTH_STEP = 1
+ADAPTIVE_DOWNPAYMENT_RESOLUTION = 10
+
+# (monthly rate, num_payments) annuity factors kept by the shared amortization table
+AMORTIZATION_TABLE_SIZE = 4096
+
+# sqlite file holding the winners of previous runs, see result_cache.py
+RESULT_CACHE_PATH = 'results_cache.sqlite3'
+
+# rows buffered before the parquet export writes a row group
+PARQUET_ROW_GROUP_SIZE = 128 * 1024
+
+# number of properties sent to a worker process at a time
+DEFAULT_CHUNK_SIZE = 64
+
+# equity is allocated across properties in whole steps of this many, see allocation.py
+ALLOCATION_EQUITY_STEP = 500
@@ -0,0 +1,113 @@
+import math
+
+from amortization import amortization_table
+from constants import *
+from permutation_grid import STATUS_EXCEEDED_MAX_DOWNPAYMENT
+from permutation_grid import STATUS_EXCEEDED_MAX_MONTHLY_INSTALLMENT
+from permutation_grid import STATUS_LESS_THAN_MINIMUM_LOAN_PRINCIPAL
+from permutation_grid import STATUS_NOT_EVALUATED
+from permutation_grid import STATUS_OK
+from scenario import DEFAULT_SCENARIO
+
+
+class FeasibilityBounds(object):
+    # Every constraint in Permutation.calculate is monotonic in the downpayment, so each one
+    # is a single cut point per term. The cut points come from the closed form and are then
+    # nudged with the exact float expressions Permutation uses, so cells land on the same
+    # side of a limit as they would by trial.
+
+    def __init__(self, prop, min_num_years, max_num_year, min_downpayment_percent, max_downpayment_percent,
+                 scenario=None):
+        self.prop = prop
+        self.scenario = scenario or DEFAULT_SCENARIO
+        self.years = range(min_num_years, max_num_year + 1)
+        self.downpayment_percents = range(min_downpayment_percent, max_downpayment_percent + 1)
+
+        lowest, highest = min_downpayment_percent, max_downpayment_percent
+        price = prop.price
+
+        self.first_exceeded_downpayment = self.boundary(
+            100.00 * self.scenario.max_downpayment / price, lowest, highest,
+            lambda downpayment_percent: self.downpayment(downpayment_percent) > self.scenario.max_downpayment,
+        )
+        self.first_small_principal = self.boundary(
+            100.00 * (1 - self.scenario.minimum_loan_principal / price), lowest, highest,
+            lambda downpayment_percent: self.loan_principal(downpayment_percent) < self.scenario.minimum_loan_principal,
+        )
+
+        self.factors = {}
+        self.first_affordable = {}
+        for num_years in self.years:
+            factor = amortization_table.factor(self.scenario.monthly_interest_rate, num_years * MONTHS)
+            self.factors[num_years] = factor
+            self.first_affordable[num_years] = self.boundary(
+                100.00 * (1 - self.scenario.max_monthly_installment / (factor * price)), lowest, highest,
+                lambda downpayment_percent: not self.installment_exceeded(downpayment_percent, factor),
+            )
+
+    def downpayment(self, downpayment_percent):
+        return self.prop.price * (downpayment_percent/100.00)
+
+    def loan_principal(self, downpayment_percent):
+        return self.prop.price - self.downpayment(downpayment_percent)
+
+    def installment_exceeded(self, downpayment_percent, factor):
+        return self.loan_principal(downpayment_percent) * factor > self.scenario.max_monthly_installment
+
+    def boundary(self, estimate, lowest, highest, predicate):
+        # smallest downpayment percent in [lowest, highest] where a False..True predicate holds, highest + 1 if none
+        downpayment_percent = min(max(int(math.ceil(estimate)), lowest), highest + 1)
+        while downpayment_percent > lowest and predicate(downpayment_percent - 1):
+            downpayment_percent -= 1
+        while downpayment_percent <= highest and not predicate(downpayment_percent):
+            downpayment_percent += 1
+        return downpayment_percent
+
+    def status(self, num_years, downpayment_percent):
+        # same precedence as Permutation.calculate raises them, and nothing past the first
+        # exceeded downpayment, which is where Property.process breaks out of a row
+        if downpayment_percent > self.first_exceeded_downpayment:
+            return STATUS_NOT_EVALUATED
+        if downpayment_percent == self.first_exceeded_downpayment:
+            return STATUS_EXCEEDED_MAX_DOWNPAYMENT
+        if downpayment_percent == 100:
+            return STATUS_OK
+        if downpayment_percent >= self.first_small_principal:
+            return STATUS_LESS_THAN_MINIMUM_LOAN_PRINCIPAL
+        if downpayment_percent < self.first_affordable[num_years]:
+            return STATUS_EXCEEDED_MAX_MONTHLY_INSTALLMENT
+        return STATUS_OK
+
+    def loan_range(self, num_years):
+        # feasible downpayments that still need a loan
+        return range(
+            max(self.downpayment_percents.start, self.first_affordable[num_years]),
+            min(self.first_exceeded_downpayment, self.first_small_principal, 100),
+        )
+
+    def full_downpayment_feasible(self):
+        return 100 in self.downpayment_percents and 100 < self.first_exceeded_downpayment
+
+    def winner_candidates(self, num_years):
+        # With num_years fixed, equity and annual income are both linear in the downpayment, so
+        # annual_ROI is linear-fractional and peaks at an end of the loan range. x_years ROI
+        # is linear-fractional on each side of the point where annual income turns positive,
+        # so the cells around that point are candidates too.
+        loan_range = self.loan_range(num_years)
+        candidates = set()
+
+        if loan_range:
+            candidates.update((loan_range[0], loan_range[-1]))
+
+            monthly_margin = self.prop.rent - self.prop.expense_total_monthly
+            factor = self.factors[num_years]
+            crossing = 100.00 * (1 - monthly_margin / (factor * self.prop.price))
+            if loan_range[0] < crossing < loan_range[-1]:
+                for downpayment_percent in range(int(math.floor(crossing)) - 1, int(math.ceil(crossing)) + 2):
+                    if downpayment_percent in loan_range:
+                        candidates.add(downpayment_percent)
+
+        if self.full_downpayment_feasible():
+            candidates.add(100)
+
+        return sorted(candidates)
@@ -0,0 +1,93 @@
+import bisect
+
+from permutation_grid import METRICS
+from ranking import RankedOption
+from ranking import RankingQuery
+
+
+# equity is minimised, both ROIs maximised
+FRONTIER_OBJECTIVES = ('equity', 'annual_ROI', 'x_years_avg_annual_roi')
+
+
+def pareto_frontier(items, objectives):
+    # objectives(item) -> (cost, gain, other_gain). Returns the items no other item beats or matches
+    # on all three, by increasing cost. Sorted by cost every earlier item costs no more, so an item
+    # is dominated exactly when an earlier one has at least both its gains. The gains of the items
+    # kept so far only matter as a staircase, gain increasing while other_gain decreases, which
+    # answers that with one bisect. Of items equal on all three the first one is kept.
+    keyed = sorted(((objectives(item), item) for item in items),
+                   key=lambda keyed_item: (keyed_item[0][0], -keyed_item[0][1], -keyed_item[0][2]))
+
+    gains = []
+    other_gains = []
+    frontier = []
+    for (cost, gain, other_gain), item in keyed:
+        position = bisect.bisect_left(gains, gain)
+        if position < len(gains) and other_gains[position] >= other_gain:
+            continue
+
+        # steps the new item covers sit right before where it goes
+        end = bisect.bisect_right(gains, gain)
+        start = end
+        while start > 0 and other_gains[start - 1] <= other_gain:
+            start -= 1
+        gains[start:end] = [gain]
+        other_gains[start:end] = [other_gain]
+
+        frontier.append(item)
+
+    return frontier
+
+
+class FrontierQuery(RankingQuery):
+    # takes the filters of a RankingQuery, rank_property gives the property's non-dominated options
+
+    def __init__(self, max_equity=None, max_monthly_installment=None, min_area=None, max_area=None):
+        super(FrontierQuery, self).__init__(
+            top_k=None, rank_by='immediate', max_equity=max_equity, max_monthly_installment=max_monthly_installment,
+            min_area=min_area, max_area=max_area)
+
+    def rank_property(self, prop):
+        indexes = [METRICS.index(name) for name in FRONTIER_OBJECTIVES]
+        cost_index, gain_index, other_gain_index = indexes
+
+        frontier = pareto_frontier(
+            self.iter_candidates(prop),
+            lambda candidate: (candidate[3][cost_index], candidate[3][gain_index], candidate[3][other_gain_index]),
+        )
+        return [
+            RankedOption(prop, num_years, downpayment_percent, score, record)
+            for score, num_years, downpayment_percent, record in frontier
+        ]
+
+
+def option_objectives(option):
+    return option.equity, option.annual_ROI, option.x_years_avg_annual_roi
+
+
+class ParetoFrontier(object):
+    # Collects the per-property frontiers of a run, results() is the frontier of the whole portfolio,
+    # or with per_property every property's own frontier in input order. An option dominated within
+    # its property is dominated in the portfolio too, so only per-property frontiers are collected,
+    # and they are pruned again whenever the collection doubles.
+
+    def __init__(self, query, per_property=False):
+        self.query = query
+        self.per_property = per_property
+        self.options = []
+        self.pruned_size = 1024
+
+    def add_options(self, options):
+        self.options.extend(options)
+
+        if not self.per_property and len(self.options) >= 2 * self.pruned_size:
+            self.options = pareto_frontier(self.options, option_objectives)
+            self.pruned_size = max(self.pruned_size, len(self.options))
+
+    def add_property(self, prop):
+        self.add_options(self.query.rank_property(prop))
+
+    def results(self):
+        if self.per_property:
+            return list(self.options)
+        return pareto_frontier(self.options, option_objectives)
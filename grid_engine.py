@@ -0,0 +1,211 @@
+import functools
+
+import numpy as np
+
+from amortization import amortization_table
+from constants import *
+from permutation_grid import METRICS
+from permutation_grid import PermutationGrid
+from permutation_grid import STATUS_EXCEEDED_MAX_DOWNPAYMENT
+from permutation_grid import STATUS_EXCEEDED_MAX_MONTHLY_INSTALLMENT
+from permutation_grid import STATUS_LESS_THAN_MINIMUM_LOAN_PRINCIPAL
+from permutation_grid import STATUS_NOT_EVALUATED
+from permutation_grid import STATUS_OK
+from scenario import DEFAULT_SCENARIO
+
+
+class GridResult(object):
+
+    metrics = METRICS
+
+    def __init__(self, years, downpayment_percents, status, **metrics):
+        self.years = years
+        self.downpayment_percents = downpayment_percents
+        self.status = status
+
+        for name in self.metrics:
+            setattr(self, name, metrics[name])
+
+    @property
+    def feasible(self):
+        return self.status == STATUS_OK
+
+    def argmax(self, metric):
+        # masked cells can never win, and np.argmax keeps the first maximum so
+        # ties resolve in the same (years, downpayment) order as the loop engine
+        values = np.where(self.feasible, getattr(self, metric), -np.inf)
+        values = np.where(np.isnan(values), -np.inf, values)
+
+        index = np.unravel_index(np.argmax(values), values.shape)
+        if values[index] <= MINIMUM_DECIMAL:
+            return None
+
+        return int(self.years[index[0]]), int(self.downpayment_percents[index[1]])
+
+    def to_permutation_grid(self, parent_prop, scenario=None):
+        grid = PermutationGrid(
+            parent_prop,
+            int(self.years[0]), int(self.years[-1]),
+            int(self.downpayment_percents[0]), int(self.downpayment_percents[-1]),
+            scenario=scenario,
+        )
+
+        # the loop engine stops a row at its first exceeded downpayment
+        exceeded_downpayment = self.status == STATUS_EXCEEDED_MAX_DOWNPAYMENT
+        status = np.where(
+            exceeded_downpayment & (np.cumsum(exceeded_downpayment, axis=1) > 1),
+            STATUS_NOT_EVALUATED, self.status,
+        ).astype(np.int8)
+
+        records = np.stack([getattr(self, name) for name in self.metrics], axis=-1)
+        grid.fill(status.tobytes(), records.astype(np.float64).tobytes())
+        return grid
+
+
+class ScenarioAxis(object):
+    # The bank parameters of several scenarios as (scenarios, 1, 1) arrays, which evaluate_axes
+    # broadcasts like a single Scenario's numbers, adding the scenario axis in front of the cells.
+
+    def __init__(self, scenarios):
+        for name in ('bank_loan_giving_fee', 'bank_mortgage_fee', 'bank_loan_stamps', 'max_downpayment',
+                     'max_monthly_installment', 'minimum_loan_principal'):
+            setattr(self, name, np.array(
+                [getattr(scenario, name) for scenario in scenarios], dtype=float)[:, np.newaxis, np.newaxis])
+
+
+class GridEngine(object):
+
+    def __init__(self, period_years=VISUALIZING_ROI_YEARS):
+        self.period_years = period_years
+
+    @staticmethod
+    @functools.lru_cache(maxsize=32)
+    def grid_axes(min_num_years, max_num_year, min_downpayment_percent, max_downpayment_percent):
+        # property and scenario independent, so shared by every evaluate() call with the same bounds
+        years = np.arange(min_num_years, max_num_year + 1)
+        downpayment_percents = np.arange(min_downpayment_percent, max_downpayment_percent + 1)
+
+        full_downpayment = (downpayment_percents == 100)[np.newaxis, :]
+        # a full downpayment carries no loan, see Permutation.__init__
+        num_years = np.where(full_downpayment, 0, years[:, np.newaxis])
+
+        axes = years, downpayment_percents, full_downpayment, num_years
+        for axis in axes:
+            axis.flags.writeable = False
+        return axes
+
+    def calc_installment_factors(self, years, scenario):
+        # the shared table keeps installments bit-identical to Permutation.calc_monthly_installment
+        return np.array(amortization_table.precompute(
+            scenario.monthly_interest_rate, int(years[0]), int(years[-1])))
+
+    def evaluate(self, prop, min_num_years, max_num_year, min_downpayment_percent, max_downpayment_percent,
+                 scenario=None):
+        scenario = scenario or DEFAULT_SCENARIO
+
+        years, downpayment_percents, full_downpayment, num_years = self.grid_axes(
+            min_num_years, max_num_year, min_downpayment_percent, max_downpayment_percent)
+        factors = self.calc_installment_factors(years, scenario)
+
+        return self.evaluate_axes(prop, years, downpayment_percents, full_downpayment, num_years, factors, scenario)
+
+    def evaluate_scenarios(self, prop, min_num_years, max_num_year, min_downpayment_percent, max_downpayment_percent,
+                           scenarios):
+        # one GridResult per scenario from a single evaluation, the cells that don't depend on the
+        # bank (downpayments, principals, expenses) are worked out once for all of them
+        years, downpayment_percents, full_downpayment, num_years = self.grid_axes(
+            min_num_years, max_num_year, min_downpayment_percent, max_downpayment_percent)
+        factors = np.stack([self.calc_installment_factors(years, scenario) for scenario in scenarios])
+
+        result = self.evaluate_axes(
+            prop, years, downpayment_percents, full_downpayment, num_years, factors, ScenarioAxis(scenarios))
+        return [
+            GridResult(years, downpayment_percents, result.status[index],
+                       **dict((name, getattr(result, name)[index]) for name in result.metrics))
+            for index in range(len(scenarios))
+        ]
+
+    def evaluate_months(self, prop, num_months, downpayment_percents, scenario=None):
+        # terms in months and fractional downpayments for the adaptive search. downpayment_percents
+        # is either one axis shared by every term or a (terms, cells) array with its own cells per term
+        scenario = scenario or DEFAULT_SCENARIO
+
+        years = np.asarray(num_months) / MONTHS
+        downpayment_percents = np.asarray(downpayment_percents, dtype=float)
+        full_downpayment = np.atleast_2d(downpayment_percents == 100)
+        num_years = np.where(full_downpayment, 0, years[:, np.newaxis])
+        factors = np.array([
+            amortization_table.factor(scenario.monthly_interest_rate, term_years * MONTHS) for term_years in years
+        ])
+
+        return self.evaluate_axes(prop, years, downpayment_percents, full_downpayment, num_years, factors, scenario)
+
+    def evaluate_axes(self, prop, years, downpayment_percents, full_downpayment, num_years, factors, scenario):
+        # every per-downpayment array is (1, cells) for a shared axis or (terms, cells)
+        downpayment = prop.price * (np.atleast_2d(downpayment_percents) / 100.00)
+        loan_principal = prop.price - downpayment
+
+        total_fees = (loan_principal * scenario.bank_loan_giving_fee + loan_principal * scenario.bank_mortgage_fee
+            + loan_principal * scenario.bank_loan_stamps)
+
+        # factors is (terms,) or (scenarios, terms) for a ScenarioAxis
+        monthly_installments = np.where(full_downpayment, 0.0, loan_principal * factors[..., np.newaxis])
+
+        total_monthly_outcome = prop.expense_total_monthly + monthly_installments
+        total_monthly_income = prop.rent - total_monthly_outcome
+        total_annual_income = total_monthly_income * MONTHS
+
+        equity = np.broadcast_to(downpayment + total_fees, total_annual_income.shape)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            annual_ROI = total_annual_income / equity
+
+            equity_with_loan = self.calc_equity_with_loan(total_annual_income, equity, num_years)
+            afterloan_annual_roi = prop.afterloan_annual_income / equity_with_loan
+            x_years_avg_annual_roi = self.calc_x_years_roi(prop, total_annual_income, equity_with_loan, num_years)
+
+        exceeded_downpayment = np.broadcast_to(downpayment > scenario.max_downpayment, total_annual_income.shape)
+        less_than_minimum_principal = np.broadcast_to(
+            (0 < loan_principal) & (loan_principal < scenario.minimum_loan_principal), total_annual_income.shape)
+        exceeded_installment = (monthly_installments > scenario.max_monthly_installment) & ~full_downpayment
+
+        # same precedence as Permutation.calculate raises them
+        status = np.full(total_annual_income.shape, STATUS_OK, dtype=np.int8)
+        status[exceeded_installment] = STATUS_EXCEEDED_MAX_MONTHLY_INSTALLMENT
+        status[less_than_minimum_principal] = STATUS_LESS_THAN_MINIMUM_LOAN_PRINCIPAL
+        status[exceeded_downpayment] = STATUS_EXCEEDED_MAX_DOWNPAYMENT
+
+        return GridResult(
+            years=years,
+            downpayment_percents=downpayment_percents,
+            status=status,
+            downpayment=np.broadcast_to(downpayment, status.shape),
+            loan_principal=np.broadcast_to(loan_principal, status.shape),
+            total_fees=np.broadcast_to(total_fees, status.shape),
+            monthly_installments=monthly_installments,
+            total_monthly_income=total_monthly_income,
+            total_annual_income=total_annual_income,
+            equity=equity,
+            annual_ROI=annual_ROI,
+            afterloan_annual_roi=afterloan_annual_roi,
+            x_years_avg_annual_roi=x_years_avg_annual_roi,
+        )
+
+    @staticmethod
+    def calc_equity_with_loan(total_annual_income, equity, num_years):
+        # calc_equity_with_loan of permutation.py for whole arrays of cells
+        # minus because total_annual_income is already negative
+        return np.where(total_annual_income <= 0.00, equity - (total_annual_income * num_years), equity)
+
+    def calc_x_years_roi(self, prop, total_annual_income, equity_with_loan, num_years):
+        # Permutation.calc_x_years_roi for whole arrays of cells. period_years may also be an array
+        # of periods, which adds their axis in front of the cells' axes
+        period_years = self.period_years
+        if np.ndim(period_years):
+            period_years = np.reshape(period_years, np.shape(period_years) + (1,) * np.ndim(total_annual_income))
+
+        loan_period_income = np.where(
+            total_annual_income <= 0.00, 0.0, total_annual_income * np.minimum(period_years, num_years))
+        after_loan_income = prop.afterloan_annual_income * (period_years - num_years)
+        after_loan_income = np.where(after_loan_income < 0, 0.0, after_loan_income)
+        return ((after_loan_income + loan_period_income) / period_years) / equity_with_loan
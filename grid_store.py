@@ -0,0 +1,210 @@
+import csv
+import json
+import mmap
+import os
+
+from constants import *
+from permutation_grid import METRICS
+from permutation_grid import PermutationGrid
+from permutation_grid import STATUS_NOT_EVALUATED
+from property import Property
+from scenario import Scenario
+from writers import Writer
+
+
+STORE_VERSION = 1
+
+HEADER_FILE = 'store.json'
+STATUS_FILE = 'status.i8'
+RECORDS_FILE = 'records.f64'
+INDEX_FILE = 'properties.csv'
+
+PROPERTY_FIELDS = ('price', 'rent', 'reletting_factor', 'gov_tax_discount', 'area', 'extra_onetime_expense', 'name', 'url')
+WINNER_FIELDS = ('max_num_years', 'max_downpayment_percent', 'x_years_num_years', 'x_years_downpayment_percent')
+
+
+# A run's grids laid end to end in two flat files, one status byte per cell and len(METRICS)
+# float64s per cell, in the same layout PermutationGrid keeps in memory. Every property takes the
+# same number of cells, so its slice is found by position alone and the store can be opened with
+# mmap and read without loading or recomputing anything. properties.csv is the small index: the
+# listing fields, enough to rebuild the Property, and its winners' cells.
+class GridStoreWriter(Writer):
+
+    def __init__(self, data=None, output_file_path='output.store', metrics=None, bounds=None):
+        super(GridStoreWriter, self).__init__(data, output_file_path, metrics)
+        self.bounds = tuple(bounds) if bounds else None
+
+        self.scenario = None
+        self.num_properties = 0
+
+    def open(self):
+        os.makedirs(self.output_file_path, exist_ok=True)
+        # the header of a previous run would make this one look complete until close() rewrites it
+        header_path = os.path.join(self.output_file_path, HEADER_FILE)
+        if os.path.exists(header_path):
+            os.remove(header_path)
+        self.status_file = open(os.path.join(self.output_file_path, STATUS_FILE), 'wb')
+        self.records_file = open(os.path.join(self.output_file_path, RECORDS_FILE), 'wb')
+        self.index_file = open(os.path.join(self.output_file_path, INDEX_FILE), 'wt', newline='')
+        self.index_writer = csv.writer(self.index_file)
+        self.index_writer.writerow(PROPERTY_FIELDS + WINNER_FIELDS)
+
+    def write_property(self, prop):
+        grid = prop.permutation_stats
+        if self.bounds is None:
+            self.bounds = self.grid_bounds(grid) if isinstance(grid, PermutationGrid) else DEFAULT_GRID_BOUNDS
+        if self.scenario is None:
+            self.scenario = prop.scenario
+
+        if isinstance(grid, PermutationGrid):
+            if self.grid_bounds(grid) != self.bounds:
+                raise ValueError('Property {} was searched over {}, the store holds {}'.format(
+                    prop.name, self.grid_bounds(grid), self.bounds))
+            if prop.scenario != self.scenario:
+                raise ValueError('Property {} was processed under {}, the store holds {}'.format(
+                    prop.name, prop.scenario, self.scenario))
+            self.status_file.write(grid.status.tobytes())
+            self.records_file.write(grid.records.tobytes())
+        else:
+            # winners only, the cells read back as not evaluated
+            num_cells = self.num_cells()
+            self.status_file.write(bytes([STATUS_NOT_EVALUATED & 0xff]) * num_cells)
+            self.records_file.write(bytes(8 * len(METRICS) * num_cells))
+
+        max_stats = prop.max_stats
+        max_stats_x_years = prop.max_stats_x_years
+        self.index_writer.writerow([getattr(prop, field) for field in PROPERTY_FIELDS] + [
+            max_stats and max_stats.num_years, max_stats and max_stats.downpayment_percent,
+            max_stats_x_years and max_stats_x_years.num_years,
+            max_stats_x_years and max_stats_x_years.downpayment_percent,
+        ])
+
+        self.num_properties += 1
+        self.metrics.count('stored_properties')
+
+    def finish(self):
+        # the data files are complete on disk before the header says so
+        self.close()
+
+        # written last and only for a run that wrote every property, a store without a header
+        # is an interrupted or failed run
+        scenario = self.scenario
+        with open(os.path.join(self.output_file_path, HEADER_FILE), 'wt') as header_file:
+            json.dump({
+                'version': STORE_VERSION,
+                'metrics': list(METRICS),
+                'bounds': list(self.bounds or DEFAULT_GRID_BOUNDS),
+                'scenario': list(scenario.key()) if scenario else None,
+                'scenario_name': scenario.name if scenario else None,
+                'num_properties': self.num_properties,
+            }, header_file, indent=2)
+
+    def close(self):
+        # safe to call again after finish()
+        self.status_file.close()
+        self.records_file.close()
+        self.index_file.close()
+
+    def num_cells(self):
+        min_num_years, max_num_year, min_downpayment_percent, max_downpayment_percent = self.bounds
+        return (max_num_year - min_num_years + 1) * (max_downpayment_percent - min_downpayment_percent + 1)
+
+    @staticmethod
+    def grid_bounds(grid):
+        return (grid.years.start, grid.years.stop - 1,
+                grid.downpayment_percents.start, grid.downpayment_percents.stop - 1)
+
+
+class GridStore(object):
+
+    def __init__(self, path):
+        self.path = path
+
+        if not os.path.isfile(os.path.join(path, HEADER_FILE)):
+            raise ValueError('{} has no {}, the export that wrote it failed or was interrupted. Export it again'.format(
+                path, HEADER_FILE))
+        with open(os.path.join(path, HEADER_FILE), 'rt') as header_file:
+            header = json.load(header_file)
+        if header['version'] != STORE_VERSION or tuple(header['metrics']) != METRICS:
+            raise ValueError('{} was written by an incompatible version'.format(path))
+
+        self.bounds = tuple(header['bounds'])
+        self.scenario = Scenario(*header['scenario'], name=header['scenario_name']) if header['scenario'] else None
+        self.num_properties = header['num_properties']
+
+        min_num_years, max_num_year, min_downpayment_percent, max_downpayment_percent = self.bounds
+        self.num_cells = (max_num_year - min_num_years + 1) * (max_downpayment_percent - min_downpayment_percent + 1)
+
+        with open(os.path.join(path, INDEX_FILE), 'rt', newline='') as index_file:
+            self.index = list(csv.DictReader(index_file))
+
+        self.status = self.map(STATUS_FILE, 'b')
+        self.records = self.map(RECORDS_FILE, 'd')
+        if (len(self.index) != self.num_properties or len(self.status) != self.num_properties * self.num_cells
+                or len(self.records) != len(self.status) * len(METRICS)):
+            self.close()
+            raise ValueError('{} does not hold the {} properties its header lists, export it again'.format(
+                path, self.num_properties))
+
+    @staticmethod
+    def is_store(path):
+        # the data files alone are enough, so a store left without a header is opened and rejected
+        return any(os.path.isfile(os.path.join(path, file_name)) for file_name in (HEADER_FILE, STATUS_FILE))
+
+    def map(self, file_name, item_format):
+        with open(os.path.join(self.path, file_name), 'rb') as mapped_file:
+            if not os.fstat(mapped_file.fileno()).st_size:
+                return memoryview(b'').cast(item_format)
+            # the mapping outlives the file object
+            return memoryview(mmap.mmap(mapped_file.fileno(), 0, access=mmap.ACCESS_READ)).cast(item_format)
+
+    def property(self, position):
+        # rebuilt from the index, its grid reads straight from the mapping
+        row = self.index[position]
+        prop = Property(**dict((field, row[field]) for field in PROPERTY_FIELDS))
+        prop.restore_winners(self.cell(row, 'max_num_years', 'max_downpayment_percent'),
+                             self.cell(row, 'x_years_num_years', 'x_years_downpayment_percent'),
+                             self.scenario)
+
+        grid = PermutationGrid(prop, *self.bounds, scenario=prop.scenario)
+        start = position * self.num_cells
+        grid.attach(
+            self.status[start:start + self.num_cells],
+            self.records[start * len(METRICS):(start + self.num_cells) * len(METRICS)],
+        )
+        prop.permutation_stats = grid
+        return prop
+
+    def cell(self, row, num_years_field, downpayment_field):
+        if not row[num_years_field]:
+            return None
+        return float(row[num_years_field]), float(row[downpayment_field])
+
+    def find(self, name):
+        for position, row in enumerate(self.index):
+            if row['name'] == name:
+                return self.property(position)
+        raise KeyError(name)
+
+    def __len__(self):
+        return self.num_properties
+
+    def __iter__(self):
+        return (self.property(position) for position in range(self.num_properties))
+
+    def close(self):
+        # a mapping still viewed by grids of properties read from the store stays open until they go
+        for view in (self.status, self.records):
+            mapping = view.obj
+            view.release()
+            if isinstance(mapping, mmap.mmap):
+                try:
+                    mapping.close()
+                except BufferError:
+                    pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
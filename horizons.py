@@ -0,0 +1,49 @@
+import numpy as np
+
+from constants import *
+from grid_engine import GridEngine
+from permutation_grid import METRICS
+from permutation_grid import STATUS_OK
+
+
+HORIZON_YEARS = range(MIN_HORIZON_YEARS, MAX_HORIZON_YEARS + 1)
+
+EQUITY_INDEX = METRICS.index('equity')
+TOTAL_ANNUAL_INCOME_INDEX = METRICS.index('total_annual_income')
+
+
+def horizon_roi(prop, grid, horizons=HORIZON_YEARS):
+    # x_years_avg_annual_roi of every cell of a PermutationGrid for every period in horizons at once,
+    # (horizons, cells) in the grid's cell order. Only the incomes depend on the period, so the
+    # stored records are enough and GridEngine works out all the periods in one broadcast.
+    records = np.frombuffer(grid.records, dtype=np.float64).reshape(-1, len(METRICS))
+    total_annual_income = records[:, TOTAL_ANNUAL_INCOME_INDEX]
+    equity = records[:, EQUITY_INDEX]
+
+    # a full downpayment carries no loan, see Permutation.__init__
+    downpayment_percents = np.array(grid.downpayment_percents)
+    num_years = np.where(downpayment_percents == 100, 0, np.array(grid.years)[:, np.newaxis]).ravel()
+
+    engine = GridEngine(np.array(horizons))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        equity_with_loan = engine.calc_equity_with_loan(total_annual_income, equity, num_years)
+        return engine.calc_x_years_roi(prop, total_annual_income, equity_with_loan, num_years)
+
+
+def horizon_winners(prop, grid, horizons=HORIZON_YEARS):
+    # {horizon: (num_years, downpayment_percent) or None}, the first maximum in grid order like update_winners
+    horizons = list(horizons)
+    feasible = np.frombuffer(grid.status, dtype=np.int8) == STATUS_OK
+
+    values = np.where(feasible, horizon_roi(prop, grid, horizons), -np.inf)
+    values = np.where(np.isnan(values), -np.inf, values)
+    index = np.argmax(values, axis=1) if values.size else np.zeros(len(horizons), dtype=int)
+
+    num_downpayments = len(grid.downpayment_percents)
+    winners = {}
+    for horizon, row, cell in zip(horizons, values, index):
+        if not row.size or row[cell] <= MINIMUM_DECIMAL:
+            winners[horizon] = None
+            continue
+        winners[horizon] = (grid.years[cell // num_downpayments], grid.downpayment_percents[cell % num_downpayments])
+    return winners
@@ -0,0 +1,152 @@
+import contextlib
+import cProfile
+import heapq
+import json
+import time
+
+from permutation_grid import STATUS_EXCEEDED_MAX_DOWNPAYMENT
+from permutation_grid import STATUS_EXCEEDED_MAX_MONTHLY_INSTALLMENT
+from permutation_grid import STATUS_LESS_THAN_MINIMUM_LOAN_PRINCIPAL
+from permutation_grid import STATUS_NOT_EVALUATED
+from permutation_grid import STATUS_OK
+
+
+STATUS_NAMES = {
+    STATUS_NOT_EVALUATED: 'not_evaluated',
+    STATUS_OK: 'feasible',
+    STATUS_EXCEEDED_MAX_DOWNPAYMENT: 'exceeded_max_downpayment',
+    STATUS_EXCEEDED_MAX_MONTHLY_INSTALLMENT: 'exceeded_max_monthly_installment',
+    STATUS_LESS_THAN_MINIMUM_LOAN_PRINCIPAL: 'less_than_minimum_loan_principal',
+}
+
+
+def property_metrics(prop, seconds, amortization_hits=0, amortization_misses=0):
+    # small and picklable, so it can ride back from a worker process on the property
+    statuses = {}
+    if prop.permutation_stats:
+        for status, count in prop.permutation_stats.status_counts().items():
+            statuses[STATUS_NAMES[status]] = count
+
+    return {
+        'seconds': seconds,
+        'evaluated_permutations': prop.evaluated_permutations,
+        'statuses': statuses,
+        # a worker's own table, lost with the worker unless it travels back here
+        'amortization_hits': amortization_hits,
+        'amortization_misses': amortization_misses,
+    }
+
+
+class NullMetrics(object):
+    # stands in when metrics are off, every hook is a no-op
+
+    enabled = False
+
+    def stage(self, name):
+        return NULL_CONTEXT
+
+    def profile(self):
+        return NULL_CONTEXT
+
+    def count(self, name, value=1):
+        pass
+
+    def add_property(self, prop):
+        pass
+
+    def as_dict(self):
+        return None
+
+
+NULL_CONTEXT = contextlib.nullcontext()
+
+
+class RunMetrics(object):
+
+    enabled = True
+
+    def __init__(self, slowest_count=10, profile_path=None):
+        self.slowest_count = slowest_count
+        self.profile_path = profile_path
+        self.profiler = None
+
+        self.stages = {}
+        self.counters = {}
+        self.statuses = {}
+        self.slowest = []
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        # stages may be entered repeatedly, e.g. once per streamed property, and accumulate
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+    @contextlib.contextmanager
+    def profile(self):
+        # cProfile only sees this process, run with workers=1 to profile the engines themselves.
+        # Entered once, by calc_loan.main around the whole command, so nothing is counted twice.
+        if self.profile_path is None:
+            yield
+            return
+
+        if self.profiler is None:
+            self.profiler = cProfile.Profile()
+
+        self.profiler.enable()
+        try:
+            yield
+        finally:
+            self.profiler.disable()
+            self.profiler.dump_stats(self.profile_path)
+            print('Wrote profile to {}'.format(self.profile_path))
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def add_property(self, prop):
+        run_metrics = prop.run_metrics
+        if run_metrics is None:
+            return
+        prop.run_metrics = None
+
+        self.count('properties')
+        self.count('evaluated_permutations', run_metrics['evaluated_permutations'])
+        self.count('property_seconds', run_metrics['seconds'])
+        self.count('amortization_hits', run_metrics['amortization_hits'])
+        self.count('amortization_misses', run_metrics['amortization_misses'])
+        for status, count in run_metrics['statuses'].items():
+            self.statuses[status] = self.statuses.get(status, 0) + count
+
+        entry = (run_metrics['seconds'], prop.name)
+        if len(self.slowest) < self.slowest_count:
+            heapq.heappush(self.slowest, entry)
+        else:
+            heapq.heappushpop(self.slowest, entry)
+
+    def amortization_stats(self):
+        # every process's table together, the parent's precompute and the workers' lookups
+        hits = self.counters.get('amortization_hits', 0)
+        misses = self.counters.get('amortization_misses', 0)
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': float(hits) / (hits + misses) if hits + misses else 0.0,
+        }
+
+    def as_dict(self):
+        return {
+            'stages': dict(self.stages),
+            'counters': dict(self.counters),
+            'statuses': dict(self.statuses),
+            'amortization_table': self.amortization_stats(),
+            'slowest_properties': [
+                {'name': name, 'seconds': seconds} for seconds, name in sorted(self.slowest, reverse=True)
+            ],
+        }
+
+    def to_json(self, output_path):
+        with open(output_path, 'wt') as output_file:
+            json.dump(self.as_dict(), output_file, indent=2)
@@ -1,21 +1,26 @@
-import math
-
+from amortization import amortization_table
 from exceptions import ExceededMaxDownpayment
 from exceptions import ExceededMaxMonthlyInstallment
 from exceptions import LessThanMinmumLoanPrincipal
 
 from constants import *
+from scenario import DEFAULT_SCENARIO
 
 
-INTEREST_RATE_DECIMAL = BANK_INTEREST_RATE/100.00
-MONTHLY_INTEREST_RATE = INTEREST_RATE_DECIMAL/ MONTHS # 0.00625
+def calc_equity_with_loan(equity, total_annual_income, num_years):
+    # a loan period that loses money is paid for out of pocket on top of the equity
+    if total_annual_income <= 0.00:
+        # minus because total_annual_income is already negative
+        return equity - (total_annual_income * num_years)
+    return equity
 
 
 class Permutation(object):
     
-    def __init__(self, parent_prop, num_years, downpayment_percent):
+    def __init__(self, parent_prop, num_years, downpayment_percent, scenario=None):
 
         self.parent_prop = parent_prop
+        self.scenario = scenario or DEFAULT_SCENARIO
         self.num_years = int(num_years)
         self.downpayment_percent = int(downpayment_percent)
 
@@ -27,11 +32,11 @@ class Permutation(object):
 
         self.downpayment = self.parent_prop.price * (self.downpayment_percent/100.00)
 
-        if self.downpayment > MAX_DOWNPAYMENT:
+        if self.downpayment > self.scenario.max_downpayment:
             raise ExceededMaxDownpayment()
 
         self.loan_principal = self.parent_prop.price - self.downpayment
-        if 0 < self.loan_principal < MINIMUM_LOAN_PRINCIPAL:
+        if 0 < self.loan_principal < self.scenario.minimum_loan_principal:
             raise LessThanMinmumLoanPrincipal()
 
         self.num_payments = self.num_years * MONTHS
@@ -49,45 +54,38 @@ class Permutation(object):
         self.annual_ROI = self.total_annual_income / self.equity
 
         self.calculate_afterloan_roi()
-        self.calc_x_years_roi(period_years=10)
+        self.calc_x_years_roi(period_years=VISUALIZING_ROI_YEARS)
 
         return self.annual_ROI
 
     def calculate_afterloan_roi(self):
 
-        self.equity_with_loan = self.equity
-        if self.total_annual_income <= 0.00:
-            # minus because total_annual_income is already negative
-            self.equity_with_loan = self.equity - (self.total_annual_income * self.num_years)
+        self.equity_with_loan = calc_equity_with_loan(self.equity, self.total_annual_income, self.num_years)
 
         self.afterloan_annual_roi = self.parent_prop.afterloan_annual_income / self.equity_with_loan
         return self.afterloan_annual_roi
 
     def calc_loan_fees(self):
-        self.loan_giving_fee = self.loan_principal * BANK_LOAN_GIVING_FEE
-        self.mortgage_fee = self.loan_principal * BANK_MORTGAGE_FEE
-        self.loan_stamps_fee = self.loan_principal * BANK_LOAN_STAMPS
+        self.loan_giving_fee = self.loan_principal * self.scenario.bank_loan_giving_fee
+        self.mortgage_fee = self.loan_principal * self.scenario.bank_mortgage_fee
+        self.loan_stamps_fee = self.loan_principal * self.scenario.bank_loan_stamps
         self.total_fees = self.loan_giving_fee + self.mortgage_fee + self.loan_stamps_fee
 
     def calc_monthly_installment(self):
-        # https://mortgage.lovetoknow.com/Calculate_Mortgage_Payments_Formula
         if self.downpayment_percent == 100:
             return
 
-        self.term = math.pow(1 + MONTHLY_INTEREST_RATE, self.num_payments)
-        self.monthly_installments = self.loan_principal * ((MONTHLY_INTEREST_RATE * self.term) / (self.term - 1))
+        self.monthly_installments = amortization_table.installment(
+            self.loan_principal, self.scenario.monthly_interest_rate, self.num_payments)
 
-        if self.monthly_installments > MAX_MONTHLY_INSTALLMENT:
+        if self.monthly_installments > self.scenario.max_monthly_installment:
             raise ExceededMaxMonthlyInstallment()
 
     def calc_x_years_roi(self, period_years):
 
-        self.equity_x_years = self.equity
+        self.equity_x_years = calc_equity_with_loan(self.equity, self.total_annual_income, self.num_years)
         loan_period_income = 0.0
-        if self.total_annual_income <= 0.00:
-            # minus because total_annual_income is already negative
-            self.equity_x_years = self.equity - (self.total_annual_income * self.num_years)
-        else:
+        if self.total_annual_income > 0.00:
             loan_period_income = self.total_annual_income * min(period_years, self.num_years)
 
         after_loan_years = period_years - self.num_years
@@ -115,6 +113,23 @@ equity_x_years: {equity_x_years:.2f}      |      x_years_avg_annual_roi: {x_year
 '''.format(**self.__dict__)
 
 
+class FinePermutation(Permutation):
+    # a term in whole months and a downpayment in fractions of a percent, see adaptive.py
+
+    def __init__(self, parent_prop, num_months, downpayment_percent, scenario=None):
+
+        self.parent_prop = parent_prop
+        self.scenario = scenario or DEFAULT_SCENARIO
+        self.num_months = int(num_months)
+        self.num_years = self.num_months / MONTHS
+        self.downpayment_percent = float(downpayment_percent)
+
+        if downpayment_percent == 100:
+            self.num_months = 0
+            self.num_years = 0
+            self.monthly_installments = 0.0
+
+
 class ShortTermPermutation(Permutation):
     def calculate(self):
         return super(ShortTermPermutation, self).calculate()
@@ -124,23 +139,23 @@ class ShortTermPermutation(Permutation):
 # TODO - remove this
 class PermutationFactory(object):
 
-    def create(self, parent_prop, num_years, downpayment_percent):
+    def create(self, parent_prop, num_years, downpayment_percent, scenario=None):
         if num_years <= 5:
-            return ShortTermPermutation(parent_prop, num_years, downpayment_percent)
+            return ShortTermPermutation(parent_prop, num_years, downpayment_percent, scenario)
         else:
-            return Permutation(parent_prop, num_years, downpayment_percent)
+            return Permutation(parent_prop, num_years, downpayment_percent, scenario)
 
 
 class ExceededMaxDownpaymentPermutation(Permutation):
     def __repr__(self):
-        return 'Exceeded Max Downpayment {}'.format(MAX_DOWNPAYMENT)
+        return 'Exceeded Max Downpayment {}'.format(self.scenario.max_downpayment)
 
 
 class ExceededMaxMonthlyInstallmentPermutation(Permutation):
     def __repr__(self):
-        return 'Exceeded Max Monthly Installment {}'.format(MAX_MONTHLY_INSTALLMENT)
+        return 'Exceeded Max Monthly Installment {}'.format(self.scenario.max_monthly_installment)
 
 
 class LessThanMinmumLoanPrincipalPermutation(Permutation):
     def __repr__(self):
-        return 'Less than minimum loan principal {}'.format(MINIMUM_LOAN_PRINCIPAL)
+        return 'Less than minimum loan principal {}'.format(self.scenario.minimum_loan_principal)
@@ -0,0 +1,163 @@
+from array import array
+from collections.abc import Mapping
+
+from permutation import ExceededMaxDownpaymentPermutation
+from permutation import ExceededMaxMonthlyInstallmentPermutation
+from permutation import LessThanMinmumLoanPrincipalPermutation
+from permutation import PermutationFactory
+
+
+STATUS_NOT_EVALUATED = -1
+STATUS_OK = 0
+STATUS_EXCEEDED_MAX_DOWNPAYMENT = 1
+STATUS_EXCEEDED_MAX_MONTHLY_INSTALLMENT = 2
+STATUS_LESS_THAN_MINIMUM_LOAN_PRINCIPAL = 3
+
+INFEASIBLE_PERMUTATIONS = {
+    STATUS_EXCEEDED_MAX_DOWNPAYMENT: ExceededMaxDownpaymentPermutation,
+    STATUS_EXCEEDED_MAX_MONTHLY_INSTALLMENT: ExceededMaxMonthlyInstallmentPermutation,
+    STATUS_LESS_THAN_MINIMUM_LOAN_PRINCIPAL: LessThanMinmumLoanPrincipalPermutation,
+}
+
+METRICS = (
+    'downpayment', 'loan_principal', 'total_fees', 'monthly_installments',
+    'total_monthly_income', 'total_annual_income', 'equity', 'annual_ROI',
+    'afterloan_annual_roi', 'x_years_avg_annual_roi',
+)
+
+
+# Every (num_years, downpayment_percent) cell is one fixed-layout record of METRICS in a
+# flat array plus a status code. It reads like the old nested dict of Permutation objects,
+# grid[num_years][downpayment_percent] builds the full Permutation only when asked for.
+class PermutationGrid(Mapping):
+
+    def __init__(self, parent_prop, min_num_years, max_num_year, min_downpayment_percent, max_downpayment_percent,
+                 scenario=None):
+        self.parent_prop = parent_prop
+        self.scenario = scenario
+        self.years = range(min_num_years, max_num_year + 1)
+        self.downpayment_percents = range(min_downpayment_percent, max_downpayment_percent + 1)
+
+        num_cells = len(self.years) * len(self.downpayment_percents)
+        self.status = array('b', [STATUS_NOT_EVALUATED]) * num_cells
+        self.records = array('d', [0.0]) * (num_cells * len(METRICS))
+
+    def cell_index(self, num_years, downpayment_percent):
+        if num_years not in self.years or downpayment_percent not in self.downpayment_percents:
+            raise KeyError((num_years, downpayment_percent))
+
+        return ((num_years - self.years.start) * len(self.downpayment_percents)
+            + (downpayment_percent - self.downpayment_percents.start))
+
+    def store(self, num_years, downpayment_percent, permutation):
+        index = self.cell_index(num_years, downpayment_percent)
+        offset = index * len(METRICS)
+
+        self.status[index] = STATUS_OK
+        self.records[offset:offset + len(METRICS)] = array('d', [getattr(permutation, name) for name in METRICS])
+
+    def mark(self, num_years, downpayment_percent, status):
+        self.status[self.cell_index(num_years, downpayment_percent)] = status
+
+    def fill(self, status, records):
+        # bulk load, status holds one code per cell and records len(METRICS) floats per cell
+        self.status = array('b', status)
+        self.records = array('d', records)
+
+    def attach(self, status, records):
+        # zero-copy, e.g. memoryview slices of a memory-mapped GridStore, which makes the grid read-only
+        self.status = status
+        self.records = records
+
+    def status_of(self, num_years, downpayment_percent):
+        return self.status[self.cell_index(num_years, downpayment_percent)]
+
+    def record(self, num_years, downpayment_percent):
+        offset = self.cell_index(num_years, downpayment_percent) * len(METRICS)
+        return dict(zip(METRICS, self.records[offset:offset + len(METRICS)]))
+
+    def iter_cells(self, status=STATUS_OK):
+        num_metrics = len(METRICS)
+        index = 0
+        for num_years in self.years:
+            for downpayment_percent in self.downpayment_percents:
+                if self.status[index] == status:
+                    offset = index * num_metrics
+                    yield num_years, downpayment_percent, self.records[offset:offset + num_metrics]
+                index += 1
+
+    def iter_evaluated_cells(self):
+        num_metrics = len(METRICS)
+        index = 0
+        for num_years in self.years:
+            for downpayment_percent in self.downpayment_percents:
+                status = self.status[index]
+                if status != STATUS_NOT_EVALUATED:
+                    offset = index * num_metrics
+                    yield num_years, downpayment_percent, status, self.records[offset:offset + num_metrics]
+                index += 1
+
+    def status_counts(self):
+        counts = {}
+        for status in self.status:
+            counts[status] = counts.get(status, 0) + 1
+        return counts
+
+    def permutation(self, num_years, downpayment_percent):
+        status = self.status_of(num_years, downpayment_percent)
+        if status == STATUS_NOT_EVALUATED:
+            raise KeyError((num_years, downpayment_percent))
+
+        if status != STATUS_OK:
+            return INFEASIBLE_PERMUTATIONS[status](
+                parent_prop=self.parent_prop,
+                num_years=num_years,
+                downpayment_percent=downpayment_percent,
+                scenario=self.scenario,
+            )
+
+        permutation = PermutationFactory().create(
+            parent_prop=self.parent_prop,
+            num_years=num_years,
+            downpayment_percent=downpayment_percent,
+            scenario=self.scenario,
+        )
+        permutation.calculate()
+        return permutation
+
+    def row_evaluated(self, num_years):
+        start = (num_years - self.years.start) * len(self.downpayment_percents)
+        return any(
+            status != STATUS_NOT_EVALUATED
+            for status in self.status[start:start + len(self.downpayment_percents)]
+        )
+
+    def __getitem__(self, num_years):
+        if num_years not in self.years or not self.row_evaluated(num_years):
+            raise KeyError(num_years)
+        return PermutationGridRow(self, num_years)
+
+    def __iter__(self):
+        return (num_years for num_years in self.years if self.row_evaluated(num_years))
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
+class PermutationGridRow(Mapping):
+
+    def __init__(self, grid, num_years):
+        self.grid = grid
+        self.num_years = num_years
+
+    def __getitem__(self, downpayment_percent):
+        return self.grid.permutation(self.num_years, downpayment_percent)
+
+    def __iter__(self):
+        return (
+            downpayment_percent for downpayment_percent in self.grid.downpayment_percents
+            if self.grid.status_of(self.num_years, downpayment_percent) != STATUS_NOT_EVALUATED
+        )
+
+    def __len__(self):
+        return sum(1 for _ in self)
@@ -1,10 +1,15 @@
-from collections import defaultdict
+import math
 
-from permutation import ExceededMaxDownpaymentPermutation
-from permutation import ExceededMaxMonthlyInstallmentPermutation
-from permutation import LessThanMinmumLoanPrincipalPermutation
-from permutation import Permutation
+from permutation import FinePermutation
 from permutation import PermutationFactory
+from permutation_grid import PermutationGrid
+from permutation_grid import STATUS_EXCEEDED_MAX_DOWNPAYMENT
+from permutation_grid import STATUS_EXCEEDED_MAX_MONTHLY_INSTALLMENT
+from permutation_grid import STATUS_LESS_THAN_MINIMUM_LOAN_PRINCIPAL
+from permutation_grid import STATUS_NOT_EVALUATED
+from permutation_grid import STATUS_OK
+from scenario import DEFAULT_SCENARIO
+from scenario import ScenarioResult
 from exceptions import ExceededMaxDownpayment
 from exceptions import ExceededMaxMonthlyInstallment
 from exceptions import LessThanMinmumLoanPrincipal
@@ -14,6 +19,8 @@ from constants import *
 
 class Property(object):
 
+    numeric_fields = ('price', 'rent', 'reletting_factor', 'gov_tax_discount', 'area', 'extra_onetime_expense')
+
     def __init__(self, price, rent, reletting_factor, gov_tax_discount, area, extra_onetime_expense, name, url):
         self.price = float(price)
         self.rent = float(rent)
@@ -26,7 +33,26 @@ class Property(object):
 
         self.annual_rent = self.rent * MONTHS
 
-        self.permutation_stats = defaultdict(lambda: defaultdict(Permutation))
+        self.scenario = DEFAULT_SCENARIO
+        self.scenario_results = []
+        self.ranked_options = []
+        self.run_metrics = None
+        self.risk = []
+        self.sensitivity = None
+
+        self.reset_winners()
+
+    def check_listing(self):
+        # float() takes 'nan' and 'inf', which no engine can rank
+        for field in self.numeric_fields:
+            if not math.isfinite(getattr(self, field)):
+                raise ValueError('{} must be a finite number, got {}'.format(field, getattr(self, field)))
+        if self.price <= 0:
+            raise ValueError('price must be positive, got {}'.format(self.price))
+
+    def reset_winners(self):
+        self.permutation_stats = {}
+        self.evaluated_permutations = 0
 
         self.max_roi = MINIMUM_DECIMAL
         self.max_stats = None
@@ -34,11 +60,54 @@ class Property(object):
         self.max_roi_x_years = MINIMUM_DECIMAL
         self.max_stats_x_years = None
 
-    def process(self, min_num_years, max_num_year, min_downpayment_percent, max_downpayment_percent):
+        # {period_years: winner}, filled by process_horizons
+        self.max_roi_by_horizon = {}
+        self.max_stats_by_horizon = {}
 
-        factory = PermutationFactory()
+    def get_engine(self, engine):
+        try:
+            return self.engines[engine]
+        except KeyError:
+            raise ValueError('Engine "{}" not supported. Supported engines are: {}'.format(
+                engine, self.engines.keys()))
+
+    def process(self, min_num_years, max_num_year, min_downpayment_percent, max_downpayment_percent,
+                engine='permutation', scenario=None):
+        process_engine = self.get_engine(engine)
+
+        self.calc_expenses()
+        self.reset_winners()
+        self.scenario = scenario or DEFAULT_SCENARIO
+        process_engine(self, min_num_years, max_num_year, min_downpayment_percent, max_downpayment_percent)
+
+    def sweep(self, min_num_years, max_num_year, min_downpayment_percent, max_downpayment_percent, scenarios,
+              engine='grid', winners_only=True):
+        process_engine = self.get_engine(engine)
+
+        # expenses don't depend on the bank parameters, work them out once for every scenario
         self.calc_expenses()
 
+        if engine == 'grid':
+            return self.sweep_grid(
+                min_num_years, max_num_year, min_downpayment_percent, max_downpayment_percent, scenarios, winners_only)
+
+        # the other engines have nothing to share between scenarios and run once per scenario
+        self.scenario_results = []
+        for scenario in scenarios:
+            self.reset_winners()
+            self.scenario = scenario
+            process_engine(self, min_num_years, max_num_year, min_downpayment_percent, max_downpayment_percent)
+            self.scenario_results.append(ScenarioResult(scenario, self, winners_only))
+
+        return self.scenario_results
+
+    def process_permutations(self, min_num_years, max_num_year, min_downpayment_percent, max_downpayment_percent):
+
+        factory = PermutationFactory()
+        self.permutation_stats = PermutationGrid(
+            self, min_num_years, max_num_year, min_downpayment_percent, max_downpayment_percent,
+            scenario=self.scenario)
+
         for num_years in range(min_num_years, max_num_year+1):
             for downpayment_percent in range(min_downpayment_percent, max_downpayment_percent+1):
 
@@ -46,39 +115,189 @@ class Property(object):
                     parent_prop=self,
                     num_years=num_years,
                     downpayment_percent=downpayment_percent,
+                    scenario=self.scenario,
                 )
+                self.evaluated_permutations += 1
 
                 try:
-                    roi = permutation.calculate()
-                    self.permutation_stats[num_years][downpayment_percent] = permutation
-
-                    if roi > self.max_roi:
-                        self.max_roi = roi
-                        self.max_stats = permutation
-
-                    if permutation.x_years_avg_annual_roi > self.max_roi_x_years:
-                        self.max_roi_x_years = permutation.x_years_avg_annual_roi
-                        self.max_stats_x_years = permutation
+                    permutation.calculate()
+                    self.permutation_stats.store(num_years, downpayment_percent, permutation)
+                    self.update_winners(permutation)
 
                 except ExceededMaxDownpayment:
-                    self.permutation_stats[num_years][downpayment_percent] = ExceededMaxDownpaymentPermutation(
-                        parent_prop=self,
-                        num_years=num_years,
-                        downpayment_percent=downpayment_percent,
-                    )
+                    self.permutation_stats.mark(num_years, downpayment_percent, STATUS_EXCEEDED_MAX_DOWNPAYMENT)
                     break
                 except ExceededMaxMonthlyInstallment:
-                    self.permutation_stats[num_years][downpayment_percent] = ExceededMaxMonthlyInstallmentPermutation(
-                        parent_prop=self,
-                        num_years=num_years,
-                        downpayment_percent=downpayment_percent,
-                    )
+                    self.permutation_stats.mark(num_years, downpayment_percent, STATUS_EXCEEDED_MAX_MONTHLY_INSTALLMENT)
                 except LessThanMinmumLoanPrincipal:
-                    self.permutation_stats[num_years][downpayment_percent] = LessThanMinmumLoanPrincipalPermutation(
-                        parent_prop=self,
-                        num_years=num_years,
-                        downpayment_percent=downpayment_percent,
-                    )
+                    self.permutation_stats.mark(num_years, downpayment_percent, STATUS_LESS_THAN_MINIMUM_LOAN_PRINCIPAL)
+
+    def process_bounded(self, min_num_years, max_num_year, min_downpayment_percent, max_downpayment_percent):
+        from feasibility import FeasibilityBounds
+
+        bounds = FeasibilityBounds(
+            self, min_num_years, max_num_year, min_downpayment_percent, max_downpayment_percent,
+            scenario=self.scenario)
+        self.permutation_stats = PermutationGrid(
+            self, min_num_years, max_num_year, min_downpayment_percent, max_downpayment_percent,
+            scenario=self.scenario)
+
+        for num_years in range(min_num_years, max_num_year+1):
+            for downpayment_percent in range(min_downpayment_percent, max_downpayment_percent+1):
+
+                status = bounds.status(num_years, downpayment_percent)
+                if status == STATUS_NOT_EVALUATED:
+                    break
+                if status != STATUS_OK:
+                    self.permutation_stats.mark(num_years, downpayment_percent, status)
+                    continue
+
+                permutation = self.create_calculated_permutation(num_years, downpayment_percent)
+                self.evaluated_permutations += 1
+                self.permutation_stats.store(num_years, downpayment_percent, permutation)
+                self.update_winners(permutation)
+
+    def process_winners(self, min_num_years, max_num_year, min_downpayment_percent, max_downpayment_percent):
+        from feasibility import FeasibilityBounds
+
+        bounds = FeasibilityBounds(
+            self, min_num_years, max_num_year, min_downpayment_percent, max_downpayment_percent,
+            scenario=self.scenario)
+
+        for num_years in range(min_num_years, max_num_year+1):
+            for downpayment_percent in bounds.winner_candidates(num_years):
+                self.evaluated_permutations += 1
+                self.update_winners(self.create_calculated_permutation(num_years, downpayment_percent))
+
+    def process_adaptive(self, min_num_years, max_num_year, min_downpayment_percent, max_downpayment_percent):
+        from adaptive import AdaptiveSearch
+
+        search = AdaptiveSearch()
+        winners = search.search(
+            self, min_num_years, max_num_year, min_downpayment_percent, max_downpayment_percent,
+            scenario=self.scenario)
+        self.evaluated_permutations = search.evaluations
+
+        # terms come back in months, the winners keep them as (fractional) years like every other engine
+        winner = winners['annual_ROI']
+        if winner is not None:
+            self.max_stats = self.create_calculated_permutation(winner[0] / MONTHS, winner[1])
+            self.max_roi = self.max_stats.annual_ROI
+
+        winner_x_years = winners['x_years_avg_annual_roi']
+        if winner_x_years is not None:
+            self.max_stats_x_years = self.create_calculated_permutation(winner_x_years[0] / MONTHS, winner_x_years[1])
+            self.max_roi_x_years = self.max_stats_x_years.x_years_avg_annual_roi
+
+    def update_winners(self, permutation):
+        if permutation.annual_ROI > self.max_roi:
+            self.max_roi = permutation.annual_ROI
+            self.max_stats = permutation
+
+        if permutation.x_years_avg_annual_roi > self.max_roi_x_years:
+            self.max_roi_x_years = permutation.x_years_avg_annual_roi
+            self.max_stats_x_years = permutation
+
+    def sweep_grid(self, min_num_years, max_num_year, min_downpayment_percent, max_downpayment_percent, scenarios,
+                   winners_only=True):
+        from grid_engine import GridEngine
+
+        # every scenario in one evaluation, and grids are only built when they are kept
+        grids = GridEngine().evaluate_scenarios(
+            self, min_num_years, max_num_year, min_downpayment_percent, max_downpayment_percent, scenarios)
+
+        self.scenario_results = []
+        for scenario, grid in zip(scenarios, grids):
+            self.reset_winners()
+            self.scenario = scenario
+            self.apply_grid_result(grid, keep_grid=not winners_only)
+            self.scenario_results.append(ScenarioResult(scenario, self, winners_only))
+
+        return self.scenario_results
+
+    def process_grid(self, min_num_years, max_num_year, min_downpayment_percent, max_downpayment_percent):
+        from grid_engine import GridEngine
+
+        grid = GridEngine().evaluate(
+            self, min_num_years, max_num_year, min_downpayment_percent, max_downpayment_percent,
+            scenario=self.scenario)
+        self.apply_grid_result(grid)
+
+    def apply_grid_result(self, grid, keep_grid=True):
+        if keep_grid:
+            self.permutation_stats = grid.to_permutation_grid(self, scenario=self.scenario)
+        self.evaluated_permutations = grid.status.size
+
+        winner = grid.argmax('annual_ROI')
+        if winner is not None:
+            self.max_stats = self.create_calculated_permutation(*winner)
+            self.max_roi = self.max_stats.annual_ROI
+
+        winner_x_years = grid.argmax('x_years_avg_annual_roi')
+        if winner_x_years is not None:
+            self.max_stats_x_years = self.create_calculated_permutation(*winner_x_years)
+            self.max_roi_x_years = self.max_stats_x_years.x_years_avg_annual_roi
+
+    def restore_winners(self, winner, winner_x_years, scenario=None):
+        # rebuilds the two winners from their (num_years, downpayment_percent) cells without searching the grid
+        self.calc_expenses()
+        self.reset_winners()
+        self.scenario = scenario or DEFAULT_SCENARIO
+
+        if winner is not None:
+            self.max_stats = self.create_calculated_permutation(*winner)
+            self.max_roi = self.max_stats.annual_ROI
+
+        if winner_x_years is not None:
+            self.max_stats_x_years = self.create_calculated_permutation(*winner_x_years)
+            self.max_roi_x_years = self.max_stats_x_years.x_years_avg_annual_roi
+
+    def create_calculated_permutation(self, num_years, downpayment_percent):
+        if num_years != int(num_years) or downpayment_percent != int(downpayment_percent):
+            # off the integer grid, a cell of the adaptive engine
+            permutation = FinePermutation(self, round(num_years * MONTHS), downpayment_percent, self.scenario)
+        else:
+            permutation = PermutationFactory().create(
+                parent_prop=self,
+                num_years=num_years,
+                downpayment_percent=downpayment_percent,
+                scenario=self.scenario,
+            )
+        permutation.calculate()
+        return permutation
+
+    def process_horizons(self, horizons=None):
+        # the x-years winner of every period in horizons, one pass over the grid already computed
+        from horizons import HORIZON_YEARS
+        from horizons import horizon_winners
+
+        if not isinstance(self.permutation_stats, PermutationGrid):
+            raise ValueError('Horizons need the permutation grid, process {} with an engine that keeps it'.format(
+                self.name))
+
+        self.max_roi_by_horizon = {}
+        self.max_stats_by_horizon = {}
+        for horizon, winner in horizon_winners(self, self.permutation_stats, horizons or HORIZON_YEARS).items():
+            if winner is None:
+                self.max_roi_by_horizon[horizon] = MINIMUM_DECIMAL
+                self.max_stats_by_horizon[horizon] = None
+                continue
+
+            permutation = self.create_calculated_permutation(*winner)
+            permutation.calc_x_years_roi(period_years=horizon)
+            self.max_roi_by_horizon[horizon] = permutation.x_years_avg_annual_roi
+            self.max_stats_by_horizon[horizon] = permutation
+
+        return self.max_stats_by_horizon
+
+    def winner_schedules(self, schedule_engine=None):
+        # monthly schedules for the winners only, built on demand rather than for every cell
+        from schedule import ScheduleEngine
+
+        winners = [winner for winner in (self.max_stats, self.max_stats_x_years) if winner is not None]
+        if not winners:
+            return None
+        return (schedule_engine or ScheduleEngine()).build_for_permutations(winners, self.scenario)
 
     def calc_expenses(self):
         self.expense_annual_govt_tax = (self.annual_rent * 0.80) * 0.15 * (1.0 - self.gov_tax_discount)
@@ -93,6 +312,25 @@ class Property(object):
         self.afterloan_annual_income = self.afterloan_monthly_income * MONTHS
 
 
+    def discard_permutation_stats(self):
+        self.permutation_stats = {}
+
+    engines = {
+        'permutation': process_permutations,
+        'grid': process_grid,
+        'bounded': process_bounded,
+        'winners': process_winners,
+        'adaptive': process_adaptive,
+    }
+
+    # engines that leave the permutation_stats grid behind, the others only find the winners
+    grid_engines = ('permutation', 'grid', 'bounded')
+
+    # (month step, downpayment steps per percent) an engine searches at, the integer grid unless listed
+    resolutions = {
+        'adaptive': (ADAPTIVE_MONTH_STEP, ADAPTIVE_DOWNPAYMENT_RESOLUTION),
+    }
+
     def __repr__(self):
         return '\n=======Property {}/{} {}=======\n{}\n'.format(
             self.price, self.rent, self.name, self.url,
@@ -0,0 +1,110 @@
+import heapq
+import itertools
+
+from permutation_grid import METRICS
+
+
+RANKING_METRICS = {
+    'immediate': 'annual_ROI',
+    'x_years': 'x_years_avg_annual_roi',
+    'afterloan': 'afterloan_annual_roi',
+}
+
+
+class RankedOption(object):
+
+    __slots__ = ('prop', 'num_years', 'downpayment_percent', 'score') + METRICS
+
+    def __init__(self, prop, num_years, downpayment_percent, score, record):
+        self.prop = prop
+        self.num_years = num_years
+        self.downpayment_percent = downpayment_percent
+        self.score = score
+
+        for name, value in zip(METRICS, record):
+            setattr(self, name, value)
+
+    def permutation(self):
+        return self.prop.create_calculated_permutation(self.num_years, self.downpayment_percent)
+
+    def __repr__(self):
+        return '{} | num_years: {} | downpayment_percent: {}% | equity: {:.2f} | score: {:.4f}'.format(
+            self.prop.name, self.num_years, self.downpayment_percent, self.equity, self.score)
+
+
+class RankingQuery(object):
+
+    def __init__(self, top_k=50, rank_by='immediate', max_equity=None, max_monthly_installment=None,
+                 min_area=None, max_area=None):
+        if rank_by not in RANKING_METRICS:
+            raise ValueError('Ranking "{}" not supported. Supported rankings are: {}'.format(
+                rank_by, RANKING_METRICS.keys()))
+
+        self.top_k = top_k
+        self.rank_by = rank_by
+        self.max_equity = max_equity
+        self.max_monthly_installment = max_monthly_installment
+        self.min_area = min_area
+        self.max_area = max_area
+
+    def accepts_property(self, prop):
+        if self.min_area is not None and prop.area < self.min_area:
+            return False
+        if self.max_area is not None and prop.area > self.max_area:
+            return False
+        return True
+
+    def iter_candidates(self, prop):
+        if not self.accepts_property(prop) or not prop.permutation_stats:
+            return
+
+        score_index = METRICS.index(RANKING_METRICS[self.rank_by])
+        equity_index = METRICS.index('equity')
+        installment_index = METRICS.index('monthly_installments')
+
+        full_downpayment_seen = False
+        for num_years, downpayment_percent, record in prop.permutation_stats.iter_cells():
+            if downpayment_percent == 100:
+                # a full downpayment carries no loan, so every year row holds the same option
+                if full_downpayment_seen:
+                    continue
+                full_downpayment_seen = True
+                num_years = 0
+
+            if self.max_equity is not None and record[equity_index] > self.max_equity:
+                continue
+            if self.max_monthly_installment is not None and record[installment_index] > self.max_monthly_installment:
+                continue
+
+            yield record[score_index], num_years, downpayment_percent, record
+
+    def rank_property(self, prop):
+        # nlargest is stable, equal scores keep the grid's (num_years, downpayment) order
+        best = heapq.nlargest(self.top_k, self.iter_candidates(prop), key=lambda candidate: candidate[0])
+        return [
+            RankedOption(prop, num_years, downpayment_percent, score, record)
+            for score, num_years, downpayment_percent, record in best
+        ]
+
+
+class TopKRanking(object):
+
+    def __init__(self, query):
+        self.query = query
+        self.heap = []
+        self.counter = itertools.count()
+
+    def add_options(self, options):
+        for option in options:
+            # earlier options win ties, so the ranking doesn't depend on the worker count
+            entry = (option.score, -next(self.counter), option)
+            if len(self.heap) < self.query.top_k:
+                heapq.heappush(self.heap, entry)
+            elif entry[:2] > self.heap[0][:2]:
+                heapq.heapreplace(self.heap, entry)
+
+    def add_property(self, prop):
+        self.add_options(self.query.rank_property(prop))
+
+    def results(self):
+        return [option for _, _, option in sorted(self.heap, key=lambda entry: entry[:2], reverse=True)]
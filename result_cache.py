@@ -0,0 +1,129 @@
+import hashlib
+import json
+import sqlite3
+import time
+
+from constants import *
+from scenario import DEFAULT_SCENARIO
+
+
+# bump whenever a change to the calculation makes previously cached winners wrong
+CALCULATION_VERSION = '1'
+
+INPUT_FIELDS = ('price', 'rent', 'reletting_factor', 'gov_tax_discount', 'area', 'extra_onetime_expense')
+
+# tunables of constants.py that change the winners, part of every key so editing them can't hit stale entries
+CALCULATION_CONSTANTS = (MONTHLY_OPERATING_EXPENSES, ANNUAL_MAINTAINENCE, VISUALIZING_ROI_YEARS)
+
+
+class ResultCache(object):
+
+    def __init__(self, path=RESULT_CACHE_PATH, version=CALCULATION_VERSION):
+        self.path = path
+        self.version = version
+
+        self.hits = 0
+        self.misses = 0
+
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('''
+            CREATE TABLE IF NOT EXISTS results (
+                key TEXT PRIMARY KEY,
+                version TEXT NOT NULL,
+                max_roi REAL,
+                max_num_years INTEGER,
+                max_downpayment_percent INTEGER,
+                max_roi_x_years REAL,
+                x_years_num_years INTEGER,
+                x_years_downpayment_percent INTEGER,
+                last_used REAL NOT NULL
+            )
+        ''')
+        self.connection.commit()
+
+    def key(self, prop, scenario=None, bounds=None, resolution=None):
+        scenario = scenario or DEFAULT_SCENARIO
+        bounds = bounds or (MIN_NUM_YEARS, MAX_NUM_YEARS, MIN_DOWNPAYMENT_PERCENT, MAX_DOWNPAYMENT_PERCENT)
+
+        parts = [
+            self.version,
+            list(CALCULATION_CONSTANTS),
+            list(scenario.key()),
+            list(bounds),
+            [getattr(prop, field) for field in INPUT_FIELDS],
+        ]
+        # integer grid winners are shared by every engine, finer searches get keys of their own
+        if resolution is not None:
+            parts.append(list(resolution))
+
+        content = json.dumps(parts)
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+    def load(self, prop, scenario=None, bounds=None, resolution=None):
+        key = self.key(prop, scenario, bounds, resolution)
+        row = self.connection.execute(
+            'SELECT max_num_years, max_downpayment_percent, x_years_num_years, x_years_downpayment_percent '
+            'FROM results WHERE key = ? AND version = ?',
+            (key, self.version),
+        ).fetchone()
+
+        if row is None:
+            self.misses += 1
+            return False
+
+        self.hits += 1
+        self.connection.execute('UPDATE results SET last_used = ? WHERE key = ?', (time.time(), key))
+
+        winner = None if row[0] is None else (row[0], row[1])
+        winner_x_years = None if row[2] is None else (row[2], row[3])
+        prop.restore_winners(winner, winner_x_years, scenario)
+        return True
+
+    def store(self, prop, scenario=None, bounds=None, resolution=None):
+        max_stats = prop.max_stats
+        max_stats_x_years = prop.max_stats_x_years
+
+        self.connection.execute(
+            'INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (
+                self.key(prop, scenario, bounds, resolution), self.version,
+                prop.max_roi,
+                max_stats and max_stats.num_years, max_stats and max_stats.downpayment_percent,
+                prop.max_roi_x_years,
+                max_stats_x_years and max_stats_x_years.num_years,
+                max_stats_x_years and max_stats_x_years.downpayment_percent,
+                time.time(),
+            ),
+        )
+
+    def commit(self):
+        self.connection.commit()
+
+    def invalidate(self):
+        # drops everything, for when the calculation changed without a CALCULATION_VERSION bump
+        self.connection.execute('DELETE FROM results')
+        self.connection.commit()
+
+    def prune(self, max_age_days=None):
+        # entries from other calculation versions can never hit again
+        deleted = self.connection.execute('DELETE FROM results WHERE version != ?', (self.version,)).rowcount
+
+        if max_age_days is not None:
+            deleted += self.connection.execute(
+                'DELETE FROM results WHERE last_used < ?',
+                (time.time() - max_age_days * 24 * 60 * 60,),
+            ).rowcount
+
+        self.connection.commit()
+        return deleted
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': self.connection.execute('SELECT COUNT(*) FROM results').fetchone()[0],
+        }
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
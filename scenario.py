@@ -0,0 +1,55 @@
+from constants import *
+
+
+class Scenario(object):
+
+    def __init__(self, bank_interest_rate=BANK_INTEREST_RATE, bank_loan_giving_fee=BANK_LOAN_GIVING_FEE,
+                 bank_mortgage_fee=BANK_MORTGAGE_FEE, bank_loan_stamps=BANK_LOAN_STAMPS,
+                 max_downpayment=MAX_DOWNPAYMENT, max_monthly_installment=MAX_MONTHLY_INSTALLMENT,
+                 minimum_loan_principal=MINIMUM_LOAN_PRINCIPAL, name=None):
+        self.bank_interest_rate = float(bank_interest_rate)
+        self.bank_loan_giving_fee = float(bank_loan_giving_fee)
+        self.bank_mortgage_fee = float(bank_mortgage_fee)
+        self.bank_loan_stamps = float(bank_loan_stamps)
+        self.max_downpayment = max_downpayment
+        self.max_monthly_installment = max_monthly_installment
+        self.minimum_loan_principal = minimum_loan_principal
+        self.name = name or 'rate {}%'.format(self.bank_interest_rate)
+
+        self.interest_rate_decimal = self.bank_interest_rate/100.00
+        self.monthly_interest_rate = self.interest_rate_decimal/ MONTHS
+
+    def key(self):
+        return (
+            self.bank_interest_rate, self.bank_loan_giving_fee, self.bank_mortgage_fee, self.bank_loan_stamps,
+            self.max_downpayment, self.max_monthly_installment, self.minimum_loan_principal,
+        )
+
+    def __eq__(self, other):
+        return isinstance(other, Scenario) and self.key() == other.key()
+
+    def __hash__(self):
+        return hash(self.key())
+
+    def __repr__(self):
+        return '<Scenario {}>'.format(self.name)
+
+
+class ScenarioResult(object):
+
+    def __init__(self, scenario, prop, winners_only=True):
+        self.scenario = scenario
+
+        self.max_roi = prop.max_roi
+        self.max_stats = prop.max_stats
+        self.max_roi_x_years = prop.max_roi_x_years
+        self.max_stats_x_years = prop.max_stats_x_years
+
+        self.permutation_stats = {} if winners_only else prop.permutation_stats
+
+    def __repr__(self):
+        return '<ScenarioResult {} max_roi={:.4f} max_roi_x_years={:.4f}>'.format(
+            self.scenario.name, self.max_roi, self.max_roi_x_years)
+
+
+DEFAULT_SCENARIO = Scenario(name='default')
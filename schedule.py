@@ -0,0 +1,167 @@
+import numpy as np
+
+from amortization import amortization_table
+from constants import *
+from permutation_grid import METRICS
+from scenario import DEFAULT_SCENARIO
+
+
+SCHEDULE_SERIES = ('payment', 'interest', 'principal', 'overpayment', 'balance')
+
+
+class RatePlan(object):
+    # annual rate steps in percent, [(first_month, rate), ...], each rate holds until the next step
+
+    def __init__(self, steps):
+        self.steps = sorted(steps)
+        if not self.steps or self.steps[0][0] != 0:
+            raise ValueError('A rate plan has to start at month 0, got {}'.format(self.steps))
+
+    @classmethod
+    def fixed_then_variable(cls, fixed_rate, fixed_years, variable_rate):
+        return cls([(0, fixed_rate), (int(fixed_years * MONTHS), variable_rate)])
+
+    def monthly_rates(self, num_months):
+        rates = np.empty(num_months)
+        for index, (first_month, rate) in enumerate(self.steps):
+            last_month = self.steps[index + 1][0] if index + 1 < len(self.steps) else num_months
+            rates[first_month:last_month] = rate/100.00/ MONTHS
+        return rates
+
+    def change_months(self):
+        return set(first_month for first_month, _ in self.steps)
+
+
+class AmortizationSchedule(object):
+    # one row per loan, one column per month, month m is the (m + 1)th payment
+
+    def __init__(self, loan_principals, num_payments, **series):
+        self.loan_principals = loan_principals
+        self.num_payments = num_payments
+        for name, values in series.items():
+            setattr(self, name, values)
+
+    def balance_at(self, month):
+        # outstanding balance after `month` payments, e.g. balance_at(10 * 12) is the 10 year mark
+        if month <= 0:
+            return self.loan_principals.copy()
+        month = min(month, self.balance.shape[1])
+        return self.balance[:, month - 1]
+
+    def total_interest(self):
+        return self.interest.sum(axis=1)
+
+    def payoff_month(self):
+        # number of payments until the balance is cleared, shorter than the term when overpaying
+        cleared = self.balance <= 0.005
+        return np.where(cleared.any(axis=1), cleared.argmax(axis=1) + 1, self.num_payments)
+
+
+class ScheduleEngine(object):
+    # Month-by-month amortization, vectorized across loans. The installment is recomputed on
+    # the outstanding balance at every rate step. Overpayments go straight to principal and
+    # shorten the term, the installment stays the same until the next step. A step recasts over
+    # the term left after those overpayments, not the original one, so it keeps the shortening.
+
+    def __init__(self, rate_plan=None, overpayments=0.0, series=SCHEDULE_SERIES):
+        self.rate_plan = rate_plan
+        # a scalar, or one amount per month
+        self.overpayments = overpayments
+        self.series = series
+
+    def build(self, loan_principals, num_payments, scenario=None):
+        scenario = scenario or DEFAULT_SCENARIO
+
+        balance = np.array(loan_principals, dtype=float)
+        num_payments = np.array(num_payments, dtype=int)
+        num_months = int(num_payments.max()) if num_payments.size else 0
+
+        if self.rate_plan is None:
+            rates = np.full(num_months, scenario.monthly_interest_rate)
+            change_months = {0}
+        else:
+            rates = self.rate_plan.monthly_rates(num_months)
+            change_months = self.rate_plan.change_months()
+
+        overpayments = np.broadcast_to(np.asarray(self.overpayments, dtype=float), (num_months,))
+
+        kept = dict((name, np.zeros((balance.size, num_months))) for name in self.series)
+        principals = balance.copy()
+        payment = np.zeros_like(balance)
+        overpaid = np.zeros(balance.shape, dtype=bool)
+
+        for month in range(num_months):
+            rate = rates[month]
+            active = (month < num_payments) & (balance > 0)
+
+            if month in change_months:
+                remaining_payments = num_payments - month
+                if overpaid.any():
+                    remaining_payments = np.where(
+                        overpaid & active,
+                        np.minimum(self.payments_to_clear(balance, payment, rates[month - 1]), remaining_payments),
+                        remaining_payments)
+                payment = np.where(active, balance * self.annuity_factors(rate, remaining_payments), 0.0)
+
+            interest = np.where(active, balance * rate, 0.0)
+            principal = np.where(active, np.minimum(payment - interest, balance), 0.0)
+            # the last payment clears whatever rounding left over
+            principal = np.where(active & (month == num_payments - 1), balance, principal)
+            overpayment = np.where(active, np.minimum(overpayments[month], balance - principal), 0.0)
+
+            balance = balance - principal - overpayment
+            overpaid |= overpayment > 0
+
+            values = {
+                'payment': interest + principal,
+                'interest': interest,
+                'principal': principal,
+                'overpayment': overpayment,
+                'balance': balance,
+            }
+            for name, series in kept.items():
+                series[:, month] = values[name]
+
+        return AmortizationSchedule(principals, num_payments, **kept)
+
+    @staticmethod
+    def payments_to_clear(balance, payment, rate):
+        # whole payments of `payment` at `rate` that clear `balance`, the term an overpaid loan has left
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if rate == 0:
+                payments = balance / payment
+            else:
+                payments = -np.log1p(-rate * balance / payment) / np.log1p(rate)
+        # a payment that no longer covers the interest never clears it, keep the contractual term then
+        payments = np.where(np.isfinite(payments), payments, np.inf)
+        # tolerate the float error of a term that is a whole number of payments
+        return np.maximum(np.ceil(payments - 1e-9), 1)
+
+    def annuity_factors(self, rate, remaining_payments):
+        remaining_payments = np.maximum(remaining_payments, 1)
+        if rate == 0:
+            return 1.0 / remaining_payments
+
+        # few distinct terms per batch, and the shared table keeps the first installment
+        # bit-identical to Permutation.calc_monthly_installment
+        terms, inverse = np.unique(remaining_payments, return_inverse=True)
+        factors = np.array([amortization_table.factor(rate, float(term)) for term in terms])
+        return factors[inverse]
+
+    def build_for_permutations(self, permutations, scenario=None):
+        # full downpayment permutations carry no loan and come out as all-zero rows
+        return self.build(
+            [getattr(permutation, 'loan_principal', 0.0) for permutation in permutations],
+            [int(permutation.num_years * MONTHS) for permutation in permutations],
+            scenario or (permutations[0].scenario if permutations else None),
+        )
+
+    def build_for_cells(self, cells, scenario=None):
+        # (num_years, downpayment_percent, record) tuples as PermutationGrid.iter_cells yields them,
+        # so exported cells get schedules without rebuilding Permutation objects
+        principal_index = METRICS.index('loan_principal')
+        return self.build(
+            [record[principal_index] for _, _, record in cells],
+            [0 if downpayment_percent == 100 else int(num_years * MONTHS) for num_years, downpayment_percent, _ in cells],
+            scenario,
+        )
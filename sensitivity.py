@@ -0,0 +1,185 @@
+import copy
+
+import numpy as np
+
+from constants import *
+from grid_engine import GridEngine
+from property import Property
+from scenario import DEFAULT_SCENARIO
+from scenario import Scenario
+
+
+PERTURBATIONS = ('rent', 'price', 'rate_up', 'rate_down')
+
+
+class SensitivityModel(object):
+
+    def __init__(self, rent_change=-0.05, price_change=0.03, rate_change=1.0, batch_size=128):
+        # relative changes of rent and price, the bank rate moves rate_change points up and down
+        self.rent_change = rent_change
+        self.price_change = price_change
+        self.rate_change = rate_change
+        # properties evaluated together, bounds memory to batch_size x grid cells x metrics floats
+        self.batch_size = batch_size
+
+
+class PropertyBatch(object):
+    # The listing fields of several properties as (properties, 1, 1) arrays. GridEngine only does
+    # arithmetic on a property's fields, so it evaluates the whole batch in one call, broadcasting
+    # over the leading axis, and the expenses come from Property.calc_expenses itself.
+
+    calc_expenses = Property.calc_expenses
+
+    def __init__(self, properties, rent_factor=1.0, price_factor=1.0):
+        self.price = self.column(properties, 'price') * price_factor
+        self.rent = self.column(properties, 'rent') * rent_factor
+        self.reletting_factor = self.column(properties, 'reletting_factor')
+        self.gov_tax_discount = self.column(properties, 'gov_tax_discount')
+
+        self.annual_rent = self.rent * MONTHS
+        self.calc_expenses()
+
+    def with_price(self, price_factor):
+        # the expenses only follow the rent, so a price change reuses them as they are
+        batch = copy.copy(self)
+        batch.price = self.price * price_factor
+        return batch
+
+    @staticmethod
+    def column(properties, name):
+        return np.array([getattr(prop, name) for prop in properties], dtype=float)[:, np.newaxis, np.newaxis]
+
+
+class SensitivityResult(object):
+
+    def __init__(self, base_roi, winner, roi_at_winner, max_roi, winners, break_even_rent):
+        self.base_roi = base_roi
+        # (num_years, downpayment_percent) of the max_stats winner
+        self.winner = winner
+        # {perturbation: ROI of the same cell, None where it turns infeasible}
+        self.roi_at_winner = roi_at_winner
+        # {perturbation: best ROI and its cell once the grid is searched again}
+        self.max_roi = max_roi
+        self.winners = winners
+        # rent at which the winner's monthly income is zero, None when the listing has no rent to scale
+        self.break_even_rent = break_even_rent
+
+    def roi_change(self, perturbation):
+        # the finite difference of the ROI for the whole perturbation, not divided by its size
+        roi = self.roi_at_winner[perturbation]
+        return None if roi is None else roi - self.base_roi
+
+    def winner_changed(self, perturbation):
+        return self.winners[perturbation] != self.winner
+
+    def __repr__(self):
+        return '<SensitivityResult winner={} {}>'.format(self.winner, ' '.join(
+            '{}_delta={}'.format(name, 'infeasible' if self.roi_change(name) is None else '{:+.4f}'.format(
+                self.roi_change(name)))
+            for name in PERTURBATIONS))
+
+
+class SensitivityAnalysis(object):
+    # How the max_stats winner of every property moves under small changes of rent, price and the
+    # bank rate. Each change is one GridEngine evaluation of a whole batch of properties, which both
+    # reads the ROI of the unchanged winning cell and searches the changed grid for a new winner.
+    # The base evaluation gives the winners themselves, so nothing is processed per property.
+
+    def __init__(self, model=None, scenario=None, period_years=VISUALIZING_ROI_YEARS):
+        self.model = model or SensitivityModel()
+        self.scenario = scenario or DEFAULT_SCENARIO
+        self.engine = GridEngine(period_years)
+
+    def perturbed_scenario(self, rate_change):
+        scenario = self.scenario
+        return Scenario(
+            # the annuity formula needs a positive rate
+            bank_interest_rate=max(scenario.bank_interest_rate + rate_change, 0.001),
+            bank_loan_giving_fee=scenario.bank_loan_giving_fee,
+            bank_mortgage_fee=scenario.bank_mortgage_fee,
+            bank_loan_stamps=scenario.bank_loan_stamps,
+            max_downpayment=scenario.max_downpayment,
+            max_monthly_installment=scenario.max_monthly_installment,
+            minimum_loan_principal=scenario.minimum_loan_principal,
+        )
+
+    def analyze(self, properties, bounds=DEFAULT_GRID_BOUNDS):
+        # sets the winners and .sensitivity of every property, batch_size properties at a time
+        for start in range(0, len(properties), self.model.batch_size):
+            self.analyze_batch(properties[start:start + self.model.batch_size], bounds)
+        return properties
+
+    def analyze_batch(self, properties, bounds):
+        model = self.model
+        rows = np.arange(len(properties))
+
+        # one expense pass for the listed fields, shared by the base case and the price and rate changes
+        listed = PropertyBatch(properties)
+        base = self.engine.evaluate(listed, *bounds, scenario=self.scenario)
+        winner_index, base_roi, has_winner = self.argmax(base, 'annual_ROI', len(properties))
+        winner_index_x_years, _, has_winner_x_years = self.argmax(base, 'x_years_avg_annual_roi', len(properties))
+
+        perturbed = {
+            'rent': (PropertyBatch(properties, rent_factor=1.0 + model.rent_change), self.scenario),
+            'price': (listed.with_price(1.0 + model.price_change), self.scenario),
+            'rate_up': (listed, self.perturbed_scenario(model.rate_change)),
+            'rate_down': (listed, self.perturbed_scenario(-model.rate_change)),
+        }
+        roi_at_winner = {}
+        perturbed_winners = {}
+        for name in PERTURBATIONS:
+            batch, scenario = perturbed[name]
+            result = self.engine.evaluate(batch, *bounds, scenario=scenario)
+
+            feasible = result.feasible.reshape(len(properties), -1)[rows, winner_index]
+            roi = result.annual_ROI.reshape(len(properties), -1)[rows, winner_index]
+            roi_at_winner[name] = np.where(feasible, roi, np.nan)
+            perturbed_winners[name] = self.argmax(result, 'annual_ROI', len(properties))
+
+        # the monthly income left after expenses is affine in the rent, read at zero rent and at
+        # the listed one, and the winner breaks even where it pays its installment
+        installment = base.monthly_installments.reshape(len(properties), -1)[rows, winner_index]
+        no_rent = PropertyBatch(properties, rent_factor=0.0)
+        intercept = no_rent.afterloan_monthly_income.ravel()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            slope = (listed.afterloan_monthly_income.ravel() - intercept) / listed.rent.ravel()
+            break_even_rent = (installment - intercept) / slope
+        # a listed rent of 0 gives no slope to solve with, nan here and None in the result
+        break_even_rent = np.where(np.isfinite(break_even_rent), break_even_rent, np.nan)
+
+        # a full downpayment carries no loan, num_years 0 like Permutation
+        cells = [(0 if downpayment_percent == 100 else int(num_years), int(downpayment_percent))
+                 for num_years in base.years for downpayment_percent in base.downpayment_percents]
+        for position, prop in enumerate(properties):
+            prop.restore_winners(
+                cells[winner_index[position]] if has_winner[position] else None,
+                cells[winner_index_x_years[position]] if has_winner_x_years[position] else None,
+                self.scenario,
+            )
+            if not has_winner[position]:
+                prop.sensitivity = None
+                continue
+
+            prop.sensitivity = SensitivityResult(
+                base_roi=float(base_roi[position]),
+                winner=cells[winner_index[position]],
+                roi_at_winner=dict(
+                    (name, None if np.isnan(roi_at_winner[name][position]) else float(roi_at_winner[name][position]))
+                    for name in PERTURBATIONS),
+                max_roi=dict(
+                    (name, float(perturbed_winners[name][1][position]) if perturbed_winners[name][2][position] else None)
+                    for name in PERTURBATIONS),
+                winners=dict(
+                    (name, cells[perturbed_winners[name][0][position]] if perturbed_winners[name][2][position] else None)
+                    for name in PERTURBATIONS),
+                break_even_rent=None if np.isnan(break_even_rent[position]) else float(break_even_rent[position]),
+            )
+
+    def argmax(self, result, metric, num_properties):
+        # GridResult.argmax for every property of the batch, same first-maximum tie order
+        values = np.where(result.feasible, getattr(result, metric), -np.inf)
+        values = np.where(np.isnan(values), -np.inf, values).reshape(num_properties, -1)
+
+        index = np.argmax(values, axis=1)
+        best = values[np.arange(num_properties), index]
+        return index, best, best > MINIMUM_DECIMAL
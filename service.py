@@ -0,0 +1,316 @@
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import os
+
+from amortization import amortization_table
+from calc_loan import process_property
+from constants import *
+from permutation_grid import METRICS
+from property import Property
+from scenario import DEFAULT_SCENARIO
+
+
+HTTP_REASONS = {
+    200: 'OK',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    413: 'Payload Too Large',
+    500: 'Internal Server Error',
+    503: 'Service Unavailable',
+}
+
+
+class ServiceError(Exception):
+
+    def __init__(self, status, message):
+        super(ServiceError, self).__init__(message)
+        self.status = status
+
+
+def winner_dict(permutation):
+    if permutation is None:
+        return None
+
+    winner = {
+        'num_years': permutation.num_years,
+        'downpayment_percent': permutation.downpayment_percent,
+    }
+    for name in METRICS:
+        winner[name] = getattr(permutation, name)
+    return winner
+
+
+def evaluate_rows(rows, engine='permutation', scenario=None):
+    # runs in a worker process, plain dicts travel back cheaper than pickled properties
+    results = []
+    for row in rows:
+        try:
+            prop = Property(**row)
+            prop.check_listing()
+            # a row the engines can't handle fails on its own, not with the rest of the batch
+            process_property(prop, engine=engine, winners_only=True, scenario=scenario)
+        except (ArithmeticError, TypeError, ValueError) as e:
+            results.append({'error': str(e)})
+            continue
+
+        results.append({
+            'name': prop.name,
+            'url': prop.url,
+            'max_roi': prop.max_roi if prop.max_stats is not None else None,
+            'max_stats': winner_dict(prop.max_stats),
+            'max_roi_x_years': prop.max_roi_x_years if prop.max_stats_x_years is not None else None,
+            'max_stats_x_years': winner_dict(prop.max_stats_x_years),
+        })
+    return results
+
+
+class EvaluationService(object):
+    # Requests wait in a bounded queue; a single batcher coalesces whatever arrives within
+    # max_batch_delay into one job of up to max_batch_size properties for the process pool.
+    # At most max_pending_batches jobs are in flight, so when the workers fall behind the queue
+    # fills up and new requests are turned away with a 503 instead of piling up in memory.
+
+    def __init__(self, host='127.0.0.1', port=8080, workers=None, engine='permutation', scenario=None,
+                 max_batch_size=256, max_batch_delay=0.005, max_queue_size=1024, max_pending_batches=None,
+                 max_body_bytes=16 * 1024 * 1024):
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.engine = engine
+        self.scenario = scenario or DEFAULT_SCENARIO
+        self.max_batch_size = max_batch_size
+        self.max_batch_delay = max_batch_delay
+        self.max_queue_size = max_queue_size
+        self.max_pending_batches = max_pending_batches
+        self.max_body_bytes = max_body_bytes
+
+        self.server = None
+        self.batcher = None
+        self.executor = None
+
+        self.counters = {
+            'requests': 0,
+            'properties': 0,
+            'batches': 0,
+            'rejected': 0,
+        }
+
+    async def start(self):
+        # filled before the pool starts, so workers begin with a warm table
+        amortization_table.precompute(self.scenario.monthly_interest_rate, MIN_NUM_YEARS, MAX_NUM_YEARS)
+        self.executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.workers)
+        # forked workers would inherit any client socket open at the time and keep it from closing,
+        # so the pool is started before the server accepts anything
+        await asyncio.get_running_loop().run_in_executor(self.executor, evaluate_rows, [])
+
+        self.queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self.pending_batches = asyncio.Semaphore(self.max_pending_batches or 2 * (self.workers or os.cpu_count()))
+        self.batcher = asyncio.ensure_future(self.run_batches())
+
+        self.server = await asyncio.start_server(self.handle_connection, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        print('Listening on http://{}:{}'.format(self.host, self.port))
+
+    async def stop(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        if self.batcher is not None:
+            self.batcher.cancel()
+            try:
+                await self.batcher
+            except asyncio.CancelledError:
+                pass
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+
+    async def serve_forever(self):
+        await self.start()
+        try:
+            await self.server.serve_forever()
+        finally:
+            await self.stop()
+
+    async def evaluate(self, rows):
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((rows, future))
+        except asyncio.QueueFull:
+            self.counters['rejected'] += 1
+            raise ServiceError(503, 'Too many queued requests, retry later')
+
+        self.counters['requests'] += 1
+        self.counters['properties'] += len(rows)
+        return await future
+
+    async def run_batches(self):
+        loop = asyncio.get_running_loop()
+
+        while True:
+            jobs = [await self.queue.get()]
+            batch_size = len(jobs[0][0])
+            deadline = loop.time() + self.max_batch_delay
+
+            while batch_size < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    job = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                jobs.append(job)
+                batch_size += len(job[0])
+
+            await self.pending_batches.acquire()
+            asyncio.ensure_future(self.run_batch(jobs))
+
+    async def run_batch(self, jobs):
+        loop = asyncio.get_running_loop()
+        rows = [row for job_rows, _ in jobs for row in job_rows]
+
+        try:
+            self.counters['batches'] += 1
+            results = await loop.run_in_executor(self.executor, evaluate_rows, rows, self.engine, self.scenario)
+        except Exception as e:
+            for _, future in jobs:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self.pending_batches.release()
+
+        start = 0
+        for job_rows, future in jobs:
+            # the client may have gone away in the meantime
+            if not future.done():
+                future.set_result(results[start:start + len(job_rows)])
+            start += len(job_rows)
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await self.read_request(reader)
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except ServiceError as e:
+                    await self.write_response(writer, e.status, {'error': str(e)}, keep_alive=False)
+                    break
+
+                method, path, headers, body = request
+                try:
+                    status, payload = 200, await self.route(method, path, body)
+                except ServiceError as e:
+                    status, payload = e.status, {'error': str(e)}
+                except Exception as e:
+                    status, payload = 500, {'error': str(e)}
+
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                await self.write_response(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        finally:
+            writer.close()
+
+    async def read_request(self, reader):
+        try:
+            head = await reader.readuntil(b'\r\n\r\n')
+        except asyncio.LimitOverrunError:
+            raise ServiceError(400, 'Request head larger than the stream limit')
+        lines = head.decode('latin-1').split('\r\n')
+        try:
+            method, path, _ = lines[0].split(' ', 2)
+        except ValueError:
+            raise ServiceError(400, 'Malformed request line')
+
+        headers = {}
+        for line in lines[1:]:
+            if ':' in line:
+                name, value = line.split(':', 1)
+                headers[name.strip().lower()] = value.strip()
+
+        try:
+            content_length = int(headers.get('content-length', 0) or 0)
+        except ValueError:
+            raise ServiceError(400, 'Content-Length must be an integer')
+        if content_length < 0:
+            raise ServiceError(400, 'Content-Length must not be negative')
+        if content_length > self.max_body_bytes:
+            raise ServiceError(413, 'Request body larger than {} bytes'.format(self.max_body_bytes))
+        body = await reader.readexactly(content_length) if content_length else b''
+
+        return method, path, headers, body
+
+    async def route(self, method, path, body):
+        if path == '/health':
+            return {
+                'status': 'ok',
+                'queued_requests': self.queue.qsize(),
+                'counters': dict(self.counters),
+            }
+
+        if path != '/evaluate':
+            raise ServiceError(404, 'Unknown path {}'.format(path))
+        if method != 'POST':
+            raise ServiceError(405, 'Use POST for /evaluate')
+
+        try:
+            data = json.loads(body or b'null')
+        except ValueError as e:
+            raise ServiceError(400, 'Invalid JSON: {}'.format(e))
+
+        # either a list of properties or {"properties": [...]}
+        rows = data.get('properties') if isinstance(data, dict) else data
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            raise ServiceError(400, 'Expected a list of property objects')
+
+        return {'properties': await self.evaluate(rows) if rows else []}
+
+    async def write_response(self, writer, status, payload, keep_alive=True):
+        body = json.dumps(payload).encode('utf-8')
+        head = 'HTTP/1.1 {} {}\r\nContent-Type: application/json\r\nContent-Length: {}\r\nConnection: {}\r\n'.format(
+            status, HTTP_REASONS.get(status, ''), len(body), 'keep-alive' if keep_alive else 'close')
+        if status == 503:
+            head += 'Retry-After: 1\r\n'
+
+        writer.write(head.encode('latin-1') + b'\r\n' + body)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve batch property evaluation over local HTTP')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--workers', type=int, help='worker processes, defaults to the CPU count')
+    parser.add_argument('--engine', default='permutation', choices=sorted(Property.engines))
+    parser.add_argument('--max-batch-size', type=int, default=256, help='properties per worker job')
+    parser.add_argument('--max-batch-delay-ms', type=float, default=5.0,
+                        help='how long to wait for more requests to join a batch')
+    parser.add_argument('--max-queue-size', type=int, default=1024,
+                        help='queued requests before new ones are rejected with 503')
+    args = parser.parse_args()
+
+    service = EvaluationService(
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        engine=args.engine,
+        max_batch_size=args.max_batch_size,
+        max_batch_delay=args.max_batch_delay_ms / 1000.0,
+        max_queue_size=args.max_queue_size,
+    )
+    try:
+        asyncio.run(service.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+import numpy as np
+
+from constants import *
+from permutation_grid import METRICS
+from scenario import DEFAULT_SCENARIO
+
+
+class RiskModel(object):
+
+    def __init__(self, num_paths=1000, seed=0, horizon_years=VISUALIZING_ROI_YEARS, rent_growth_mean=0.02,
+                 rent_growth_volatility=0.03, void_rate=0.04, rate_reset_years=5, rate_volatility=1.0,
+                 option_chunk_size=64):
+        self.num_paths = num_paths
+        self.seed = seed
+        self.horizon_years = horizon_years
+        # annual rent growth ~ Normal(mean, volatility)
+        self.rent_growth_mean = rent_growth_mean
+        self.rent_growth_volatility = rent_growth_volatility
+        # chance of any given month standing empty on top of the reletting factor
+        self.void_rate = void_rate
+        # the bank rate is fixed for rate_reset_years, then moves by Normal(0, rate_volatility) points per reset
+        self.rate_reset_years = rate_reset_years
+        self.rate_volatility = rate_volatility
+        # options simulated together, bounds memory to option_chunk_size x num_paths x horizon_years floats
+        self.option_chunk_size = option_chunk_size
+
+
+class RiskSimulator(object):
+
+    def __init__(self, model, scenario=None):
+        self.model = model
+        self.scenario = scenario or DEFAULT_SCENARIO
+
+    def draw_paths(self, rng):
+        model = self.model
+        shape = (model.num_paths, model.horizon_years)
+
+        growth = rng.normal(model.rent_growth_mean, model.rent_growth_volatility, shape)
+        # the first year is let at today's rent
+        growth[:, 0] = 0.0
+        rent_index = np.cumprod(1.0 + growth, axis=1)
+
+        let_months = MONTHS - rng.binomial(int(MONTHS), model.void_rate, shape)
+
+        num_resets = (model.horizon_years - 1) // model.rate_reset_years if model.rate_reset_years else 0
+        shocks = rng.normal(0.0, model.rate_volatility, (model.num_paths, num_resets))
+        reset_rates = self.scenario.bank_interest_rate + np.cumsum(shocks, axis=1)
+
+        annual_rates = np.full(shape, self.scenario.bank_interest_rate)
+        for reset in range(num_resets):
+            start = (reset + 1) * model.rate_reset_years
+            annual_rates[:, start:] = reset_rates[:, reset:reset + 1]
+        np.maximum(annual_rates, 0.0, out=annual_rates)
+
+        return rent_index, let_months, annual_rates
+
+    def simulate(self, prop, options, property_index=0):
+        # options are (num_years, downpayment_percent, record) tuples as stored in PermutationGrid.
+        # Every option of a property sees the same paths, so they compare on equal terms, and
+        # seeding by property index keeps results independent of how work is spread over workers.
+        rng = np.random.default_rng([self.model.seed, property_index])
+        paths = self.draw_paths(rng)
+
+        summaries = []
+        for start in range(0, len(options), self.model.option_chunk_size):
+            summaries.extend(self.simulate_options(prop, options[start:start + self.model.option_chunk_size], paths))
+        return summaries
+
+    def simulate_options(self, prop, options, paths):
+        rent_index, let_months, annual_rates = paths
+        horizon_years = self.model.horizon_years
+
+        # loans are stepped a year at a time, a fraction of a year would be silently cut off
+        for years, downpayment_percent, _ in options:
+            if years != int(years) or downpayment_percent != int(downpayment_percent):
+                raise ValueError('Only whole-year, whole-percent options can be simulated, got {} years at {}%'.format(
+                    years, downpayment_percent))
+
+        num_years = np.array([0 if downpayment_percent == 100 else years for years, downpayment_percent, _ in options])
+        principal_index = METRICS.index('loan_principal')
+        equity_index = METRICS.index('equity')
+        balance = np.array([record[principal_index] for _, _, record in options], dtype=float)[:, np.newaxis]
+        equity = np.array([record[equity_index] for _, _, record in options], dtype=float)[:, np.newaxis]
+
+        balance = np.broadcast_to(balance, (len(options), self.model.num_paths)).copy()
+        payment = np.zeros_like(balance)
+
+        fixed_expenses = (MONTHLY_OPERATING_EXPENSES + MONTHLY_MAINTAINENCE) * MONTHS
+        incomes = np.empty((len(options), self.model.num_paths, horizon_years))
+
+        for year in range(horizon_years):
+            rent = prop.rent * rent_index[:, year]
+            monthly_rate = np.maximum(annual_rates[:, year] / 100.00 / MONTHS, 1e-12)
+
+            in_loan = (year < num_years)[:, np.newaxis]
+            reset = year == 0 or (self.model.rate_reset_years and year % self.model.rate_reset_years == 0)
+            if reset:
+                remaining_payments = np.maximum(num_years - year, 1)[:, np.newaxis] * MONTHS
+                term = np.power(1 + monthly_rate, remaining_payments)
+                payment = np.where(in_loan, balance * (monthly_rate * term) / (term - 1), 0.0)
+
+            growth = np.power(1 + monthly_rate, MONTHS)
+            balance = np.where(in_loan, balance * growth - payment * (growth - 1) / monthly_rate, 0.0)
+            np.maximum(balance, 0.0, out=balance)
+
+            expenses = ((rent * MONTHS * 0.80) * 0.15 * (1.0 - prop.gov_tax_discount)
+                + rent * prop.reletting_factor + fixed_expenses)
+            incomes[:, :, year] = let_months[:, year] * rent - expenses - np.where(in_loan, payment * MONTHS, 0.0)
+
+        first_year_roi = incomes[:, :, 0] / equity
+
+        # shortfalls are paid in by the owner, the same treatment Permutation.calc_x_years_roi gives them
+        injected = np.maximum(-incomes, 0.0).sum(axis=2)
+        earned = np.maximum(incomes, 0.0).sum(axis=2)
+        x_years_roi = (earned / horizon_years) / (equity + injected)
+
+        negative_cash_flow = (incomes < 0).any(axis=2).mean(axis=1)
+
+        first_year_p5, first_year_p95 = np.percentile(first_year_roi, [5, 95], axis=1)
+        x_years_p5, x_years_p95 = np.percentile(x_years_roi, [5, 95], axis=1)
+
+        return [
+            {
+                'num_years': int(years),
+                'downpayment_percent': int(downpayment_percent),
+                'annual_roi_mean': float(first_year_roi[index].mean()),
+                'annual_roi_p5': float(first_year_p5[index]),
+                'annual_roi_p95': float(first_year_p95[index]),
+                'x_years_roi_mean': float(x_years_roi[index].mean()),
+                'x_years_roi_p5': float(x_years_p5[index]),
+                'x_years_roi_p95': float(x_years_p95[index]),
+                'probability_negative_cash_flow': float(negative_cash_flow[index]),
+            }
+            for index, (years, downpayment_percent, _) in enumerate(options)
+        ]
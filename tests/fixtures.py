@@ -0,0 +1,36 @@
+import csv
+import random
+
+from constants import *
+
+
+LISTING_FIELDS = ('price', 'rent', 'reletting_factor', 'gov_tax_discount', 'area', 'extra_onetime_expense', 'name', 'url')
+
+
+def make_listings(num_listings=12, seed=0):
+    # seeded like benchmark.generate_listings, with a few that lose money every month
+    rng = random.Random(seed)
+    listings = []
+    for index in range(num_listings):
+        price = round(rng.uniform(30000, 250000), -2)
+        rent = round(price * rng.uniform(0.02, 0.10) / MONTHS)
+        listings.append(dict(
+            price=price, rent=rent, reletting_factor=rng.choice((0.0, 0.5, 1.5)),
+            gov_tax_discount=rng.choice((0.0, 0.25)), area=rng.uniform(30, 120),
+            extra_onetime_expense=rng.choice((0, 1500)), name='Listing {}'.format(index), url='',
+        ))
+    return listings
+
+
+def winner(permutation):
+    if permutation is None:
+        return None
+    return (permutation.num_years, permutation.downpayment_percent, permutation.annual_ROI,
+            permutation.x_years_avg_annual_roi)
+
+
+def write_listings(output_path, listings):
+    with open(output_path, 'wt', newline='') as output_file:
+        writer = csv.DictWriter(output_file, LISTING_FIELDS)
+        writer.writeheader()
+        writer.writerows(listings)
@@ -0,0 +1,137 @@
+import itertools
+import random
+import unittest
+
+import numpy as np
+
+from allocation import ALLOCATION_OBJECTIVES
+from allocation import AllocationQuery
+from allocation import CapitalAllocation
+from allocation import option_income
+from fixtures import make_listings
+from permutation_grid import METRICS
+from property import Property
+from ranking import RankedOption
+
+
+EQUITY_STEP = 500
+BOUNDS = (1, 5, 20, 100)
+
+
+def make_option(name, equity, score):
+    record = [0.0] * len(METRICS)
+    record[METRICS.index('equity')] = equity
+    return RankedOption(name, 0, 100, score, record)
+
+
+def make_groups(rng, num_properties=4):
+    # a few options per property, some too expensive for any budget the tests use
+    return [
+        [make_option('Property {}'.format(index), rng.uniform(1000, 30000), rng.uniform(100, 3000))
+         for _ in range(rng.randint(1, 4))]
+        for index in range(num_properties)
+    ]
+
+
+def brute_force(query, budget, groups):
+    # every way of taking at most one option per property
+    capacity = int(budget // query.equity_step)
+    best = 0.0
+    for picks in itertools.product(*[[None] + options for options in groups]):
+        picked = [option for option in picks if option is not None]
+        if sum(query.equity_steps(option.equity) for option in picked) <= capacity:
+            best = max(best, sum(option.score for option in picked))
+    return best
+
+
+class CapitalAllocationTest(unittest.TestCase):
+    # the knapsack DP against trying every combination of a small portfolio
+
+    def allocate(self, budget, groups, objective='immediate'):
+        query = AllocationQuery(EQUITY_STEP, objective)
+        allocation = CapitalAllocation(query, budget)
+        for options in groups:
+            allocation.add_options(options)
+        return query, allocation
+
+    def assert_valid(self, query, allocation, groups):
+        results = allocation.results()
+        self.assertLessEqual(sum(query.equity_steps(option.equity) for option in results), allocation.capacity)
+        self.assertLessEqual(sum(option.equity for option in results), allocation.budget)
+        self.assertAlmostEqual(sum(option.score for option in results), allocation.total_income, places=6)
+
+        # at most one option per property, in input order
+        group_of = dict((id(option), index) for index, options in enumerate(groups) for option in options)
+        picked_groups = [group_of[id(option)] for option in results]
+        self.assertEqual(picked_groups, sorted(set(picked_groups)))
+
+    def test_against_brute_force(self):
+        rng = random.Random(0)
+        for seed in range(20):
+            groups = make_groups(rng)
+            for budget in (2000, 15000, 40000, 100000):
+                with self.subTest(seed=seed, budget=budget):
+                    query, allocation = self.allocate(budget, groups)
+                    self.assertAlmostEqual(allocation.total_income, brute_force(query, budget, groups), places=6)
+                    self.assert_valid(query, allocation, groups)
+
+    def test_listings_against_brute_force(self):
+        # every positive candidate of two real properties, not only the frontier the query keeps.
+        # Most listings lose money every month, take the first two with options under both objectives
+        props = []
+        for listing in make_listings(40):
+            prop = Property(**listing)
+            prop.process(*BOUNDS, engine='grid')
+            if all(AllocationQuery(EQUITY_STEP, objective).rank_property(prop) for objective in ALLOCATION_OBJECTIVES):
+                props.append(prop)
+        props = props[:2]
+        self.assertEqual(len(props), 2)
+
+        for objective in ALLOCATION_OBJECTIVES:
+            query = AllocationQuery(EQUITY_STEP, objective)
+            candidates = []
+            for prop in props:
+                steps, incomes = [0], [0.0]
+                for _, num_years, downpayment_percent, record in query.iter_candidates(prop):
+                    income = option_income(record, num_years, objective)
+                    if income > 0.00:
+                        steps.append(query.equity_steps(record[METRICS.index('equity')]))
+                        incomes.append(income)
+                candidates.append((np.array(steps), np.array(incomes)))
+
+            (first_steps, first_incomes), (second_steps, second_incomes) = candidates
+            total_steps = first_steps[:, None] + second_steps[None, :]
+            total_incomes = first_incomes[:, None] + second_incomes[None, :]
+
+            for budget in (30000, 50000, 80000, 150000):
+                with self.subTest(objective=objective, budget=budget):
+                    allocation = CapitalAllocation(query, budget)
+                    for prop in props:
+                        allocation.add_property(prop)
+
+                    affordable = total_steps <= allocation.capacity
+                    expected = total_incomes[affordable].max()
+                    self.assertGreater(expected, 0.0)
+                    self.assertAlmostEqual(allocation.total_income, expected, places=6)
+                    self.assertAlmostEqual(sum(option.score for option in allocation.results()), expected, places=6)
+
+    def test_budget_too_small(self):
+        groups = make_groups(random.Random(1))
+        cheapest = min(option.equity for options in groups for option in options)
+
+        for budget in (0, EQUITY_STEP - 1, cheapest - EQUITY_STEP):
+            with self.subTest(budget=budget):
+                query, allocation = self.allocate(budget, groups)
+                self.assertEqual(allocation.results(), [])
+                self.assertEqual(allocation.total_income, 0.0)
+
+    def test_zero_candidates(self):
+        for groups in ([], [[], []]):
+            with self.subTest(groups=groups):
+                query, allocation = self.allocate(100000, groups)
+                self.assertEqual(allocation.results(), [])
+                self.assertEqual(allocation.total_income, 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
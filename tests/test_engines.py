@@ -0,0 +1,147 @@
+import unittest
+
+import numpy as np
+
+from constants import *
+from fixtures import make_listings
+from fixtures import winner
+from grid_engine import GridEngine
+from permutation_grid import STATUS_OK
+from property import Property
+from scenario import DEFAULT_SCENARIO
+from scenario import Scenario
+
+
+SCENARIOS = (
+    DEFAULT_SCENARIO,
+    Scenario(bank_loan_giving_fee=0.01, bank_mortgage_fee=0.012, bank_loan_stamps=0.003, name='fees'),
+    Scenario(bank_interest_rate=7.5, bank_loan_giving_fee=0.02, name='high rate with fees'),
+    Scenario(bank_interest_rate=3.0, max_downpayment=25000, max_monthly_installment=450,
+             minimum_loan_principal=30000, name='tight bank'),
+)
+
+GRID_BOUNDS = (
+    DEFAULT_GRID_BOUNDS,
+    (1, 10, 20, 100),
+    (5, 25, 30, 90),
+    (1, 40, 5, 100),
+)
+
+
+class EngineAgreementTest(unittest.TestCase):
+    # every engine must pick the permutation engine's winners, same cell and same ROI to the bit
+
+    def process(self, listing, engine, scenario, bounds):
+        prop = Property(**listing)
+        prop.process(*bounds, engine=engine, scenario=scenario)
+        return prop
+
+    def assert_same_winners(self, engine):
+        for scenario in SCENARIOS:
+            for bounds in GRID_BOUNDS:
+                for listing in make_listings():
+                    with self.subTest(scenario=scenario.name, bounds=bounds, listing=listing['name']):
+                        expected = self.process(listing, 'permutation', scenario, bounds)
+                        prop = self.process(listing, engine, scenario, bounds)
+
+                        self.assertEqual(winner(prop.max_stats), winner(expected.max_stats))
+                        self.assertEqual(winner(prop.max_stats_x_years), winner(expected.max_stats_x_years))
+
+    def test_grid(self):
+        self.assert_same_winners('grid')
+
+    def test_bounded(self):
+        self.assert_same_winners('bounded')
+
+    def test_winners(self):
+        self.assert_same_winners('winners')
+
+    def test_grids_of_grid_engines(self):
+        # the cells both engines evaluate hold the same records
+        for scenario in SCENARIOS:
+            for listing in make_listings():
+                with self.subTest(scenario=scenario.name, listing=listing['name']):
+                    expected = self.process(listing, 'permutation', scenario, DEFAULT_GRID_BOUNDS).permutation_stats
+                    for engine in ('grid', 'bounded'):
+                        grid = self.process(listing, engine, scenario, DEFAULT_GRID_BOUNDS).permutation_stats
+                        for num_years, downpayment_percent, status, record in expected.iter_evaluated_cells():
+                            self.assertEqual(grid.status_of(num_years, downpayment_percent), status)
+                            if status == STATUS_OK:
+                                self.assertEqual(grid.record(num_years, downpayment_percent),
+                                                 expected.record(num_years, downpayment_percent))
+
+    def test_sweep(self):
+        # the batched grid sweep against one run per scenario
+        for listing in make_listings():
+            prop = Property(**listing)
+            results = prop.sweep(*DEFAULT_GRID_BOUNDS, scenarios=SCENARIOS, engine='grid')
+            for scenario, result in zip(SCENARIOS, results):
+                with self.subTest(scenario=scenario.name, listing=listing['name']):
+                    expected = self.process(listing, 'permutation', scenario, DEFAULT_GRID_BOUNDS)
+                    self.assertEqual(winner(result.max_stats), winner(expected.max_stats))
+                    self.assertEqual(winner(result.max_stats_x_years), winner(expected.max_stats_x_years))
+
+
+class AdaptiveEngineTest(unittest.TestCase):
+    # the adaptive engine must find the winners of the whole fine grid, which the brute force here evaluates
+
+    bounds = (1, 10, 20, 100)
+
+    def brute_force(self, prop, scenario):
+        min_num_years, max_num_year, min_downpayment_percent, max_downpayment_percent = self.bounds
+        num_months = np.arange(min_num_years * MONTHS, max_num_year * MONTHS + 1, ADAPTIVE_MONTH_STEP)
+        ticks = np.arange(min_downpayment_percent * ADAPTIVE_DOWNPAYMENT_RESOLUTION,
+                          max_downpayment_percent * ADAPTIVE_DOWNPAYMENT_RESOLUTION + 1)
+        downpayment_percents = ticks / float(ADAPTIVE_DOWNPAYMENT_RESOLUTION)
+
+        prop.calc_expenses()
+        result = GridEngine().evaluate_months(prop, num_months, downpayment_percents, scenario)
+
+        winners = {}
+        for objective in ('annual_ROI', 'x_years_avg_annual_roi'):
+            values = np.where(result.feasible, getattr(result, objective), -np.inf)
+            values = np.where(np.isnan(values), -np.inf, values)
+            # first maximum in (term, downpayment) order
+            index = np.argmax(values)
+            if values.flat[index] <= MINIMUM_DECIMAL:
+                winners[objective] = None
+                continue
+            row, column = np.unravel_index(index, values.shape)
+            winners[objective] = (values.flat[index], downpayment_percents[column],
+                                  0 if downpayment_percents[column] == 100 else num_months[row])
+        return winners
+
+    def test_adaptive(self):
+        for scenario in SCENARIOS:
+            for listing in make_listings():
+                with self.subTest(scenario=scenario.name, listing=listing['name']):
+                    prop = Property(**listing)
+                    expected = self.brute_force(prop, scenario)
+                    prop.process(*self.bounds, engine='adaptive', scenario=scenario)
+
+                    for objective, permutation in (('annual_ROI', prop.max_stats),
+                                                   ('x_years_avg_annual_roi', prop.max_stats_x_years)):
+                        if expected[objective] is None:
+                            self.assertIsNone(permutation)
+                            continue
+                        roi, downpayment_percent, num_months = expected[objective]
+                        self.assertEqual(getattr(permutation, objective), roi)
+                        self.assertEqual(permutation.downpayment_percent, downpayment_percent)
+                        self.assertEqual(permutation.num_years * MONTHS, num_months)
+
+    def test_adaptive_beats_integer_grid(self):
+        # the fine grid holds every integer cell, so its winners are never worse
+        for scenario in SCENARIOS:
+            for listing in make_listings():
+                with self.subTest(scenario=scenario.name, listing=listing['name']):
+                    expected = Property(**listing)
+                    expected.process(*self.bounds, engine='permutation', scenario=scenario)
+                    prop = Property(**listing)
+                    prop.process(*self.bounds, engine='adaptive', scenario=scenario)
+
+                    self.assertGreaterEqual(prop.max_roi, expected.max_roi)
+                    self.assertGreaterEqual(prop.max_roi_x_years, expected.max_roi_x_years)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import random
+import unittest
+
+from fixtures import make_listings
+from frontier import FRONTIER_OBJECTIVES
+from frontier import FrontierQuery
+from frontier import ParetoFrontier
+from frontier import option_objectives
+from frontier import pareto_frontier
+from permutation_grid import METRICS
+from property import Property
+
+
+def dominates(objectives, other):
+    # at least as good on all three, cost minimised and both gains maximised
+    return objectives[0] <= other[0] and objectives[1] >= other[1] and objectives[2] >= other[2]
+
+
+def brute_force(items, objectives):
+    # every pair, an item stays unless another one dominates it, of items equal on all three the first stays
+    keyed = [objectives(item) for item in items]
+    kept = []
+    for index, item in enumerate(items):
+        if any(dominates(keyed[other], keyed[index]) and (keyed[other] != keyed[index] or other < index)
+               for other in range(len(items)) if other != index):
+            continue
+        kept.append((keyed[index], index, item))
+
+    # by increasing cost, ties by decreasing gains and then input order
+    kept.sort(key=lambda kept_item: (kept_item[0][0], -kept_item[0][1], -kept_item[0][2], kept_item[1]))
+    return [item for _, _, item in kept]
+
+
+def make_items(rng, num_items, num_values):
+    # few distinct values per axis, so ties on one, two or all three axes are common
+    return [(rng.randrange(num_values), rng.randrange(num_values), rng.randrange(num_values), index)
+            for index in range(num_items)]
+
+
+def item_objectives(item):
+    return item[:3]
+
+
+class ParetoFrontierTest(unittest.TestCase):
+    # the staircase frontier against checking every pair for dominance
+
+    def test_against_brute_force(self):
+        rng = random.Random(0)
+        for num_items in (0, 1, 2, 5, 20, 100):
+            for num_values in (2, 4, 50):
+                for _ in range(10):
+                    items = make_items(rng, num_items, num_values)
+                    with self.subTest(items=items):
+                        self.assertEqual(pareto_frontier(items, item_objectives), brute_force(items, item_objectives))
+
+    def test_ties(self):
+        cases = (
+            # same cost, the higher gains win
+            [(1, 5, 5, 0), (1, 6, 5, 1), (1, 5, 6, 2)],
+            # same gain, the cheaper one wins unless the other gain makes up for it
+            [(1, 5, 3, 0), (2, 5, 3, 1), (2, 5, 4, 2)],
+            # same other gain along a staircase
+            [(1, 3, 7, 0), (2, 4, 7, 1), (3, 5, 7, 2), (4, 2, 8, 3)],
+            # equal on all three, the first one is kept
+            [(2, 4, 4, 0), (1, 1, 1, 1), (2, 4, 4, 2)],
+        )
+        for items in cases:
+            with self.subTest(items=items):
+                frontier = pareto_frontier(items, item_objectives)
+                self.assertEqual(frontier, brute_force(items, item_objectives))
+
+        self.assertEqual(pareto_frontier(cases[0], item_objectives), [(1, 6, 5, 1), (1, 5, 6, 2)])
+        self.assertEqual(pareto_frontier(cases[3], item_objectives), [(1, 1, 1, 1), (2, 4, 4, 0)])
+
+    def test_float_objectives(self):
+        rng = random.Random(1)
+        items = [(rng.uniform(0, 1), rng.uniform(0, 1), rng.uniform(0, 1), index) for index in range(300)]
+        self.assertEqual(pareto_frontier(items, item_objectives), brute_force(items, item_objectives))
+
+    def test_property_frontiers(self):
+        indexes = [METRICS.index(name) for name in FRONTIER_OBJECTIVES]
+        query = FrontierQuery()
+        collected = ParetoFrontier(query)
+        # small enough that adding the properties prunes the collection on the way
+        collected.pruned_size = 4
+
+        options = []
+        for listing in make_listings():
+            prop = Property(**listing)
+            prop.process(1, 10, 20, 100, engine='grid')
+
+            candidates = list(query.iter_candidates(prop))
+            expected = brute_force(candidates, lambda candidate: tuple(candidate[3][index] for index in indexes))
+            frontier = query.rank_property(prop)
+            with self.subTest(listing=listing['name']):
+                self.assertEqual([(option.num_years, option.downpayment_percent) for option in frontier],
+                                 [(candidate[1], candidate[2]) for candidate in expected])
+
+            options.extend(frontier)
+            collected.add_options(frontier)
+
+        self.assertEqual(collected.results(), brute_force(options, option_objectives))
+
+
+if __name__ == '__main__':
+    unittest.main()
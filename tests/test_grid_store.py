@@ -0,0 +1,91 @@
+import os
+import tempfile
+import unittest
+
+from calc_loan import LandlordPropertyCalculator
+from constants import *
+from fixtures import make_listings
+from fixtures import winner
+from fixtures import write_listings
+from grid_store import GridStore
+from permutation_grid import STATUS_OK
+from property import Property
+from scenario import DEFAULT_SCENARIO
+from scenario import Scenario
+
+
+SCENARIO = Scenario(bank_interest_rate=6.0, bank_loan_giving_fee=0.01, name='stored')
+BOUNDS = (1, 20, 20, 100)
+
+
+class GridStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.listings = make_listings()
+        self.input_path = os.path.join(self.directory.name, 'listings.csv')
+        write_listings(self.input_path, self.listings)
+        self.store_path = os.path.join(self.directory.name, 'run.store')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def export(self, bounds, engine='grid', scenario=SCENARIO):
+        calculator = LandlordPropertyCalculator(self.input_path, bounds=bounds)
+        return calculator.export(self.store_path, 'store', engine=engine, scenario=scenario, bounds=bounds)
+
+    def export_failing(self):
+        # without fees a 0% downpayment leaves no equity for the loop engine to divide by
+        with self.assertRaises(ZeroDivisionError):
+            self.export((1, 20, 0, 100), engine='permutation', scenario=DEFAULT_SCENARIO)
+
+    def test_round_trip(self):
+        self.assertTrue(self.export(BOUNDS))
+
+        expected = []
+        for listing in self.listings:
+            prop = Property(**listing)
+            prop.process(*BOUNDS, engine='permutation', scenario=SCENARIO)
+            expected.append(prop)
+
+        with GridStore(self.store_path) as store:
+            self.assertEqual(store.num_properties, len(self.listings))
+            self.assertEqual(len(store), len(self.listings))
+            self.assertEqual(store.bounds, BOUNDS)
+            self.assertEqual(store.scenario, SCENARIO)
+
+            for expected_prop, prop in zip(expected, store):
+                self.assertEqual(prop.name, expected_prop.name)
+                self.assertEqual(winner(prop.max_stats), winner(expected_prop.max_stats))
+                self.assertEqual(winner(prop.max_stats_x_years), winner(expected_prop.max_stats_x_years))
+
+                grid = prop.permutation_stats
+                expected_grid = expected_prop.permutation_stats
+                for num_years, downpayment_percent, status, record in expected_grid.iter_evaluated_cells():
+                    self.assertEqual(grid.status_of(num_years, downpayment_percent), status)
+                    if status == STATUS_OK:
+                        self.assertEqual(grid.record(num_years, downpayment_percent),
+                                         expected_grid.record(num_years, downpayment_percent))
+
+        # through the calculator, the way rank and export read a store
+        calculator = LandlordPropertyCalculator(self.store_path, 'store', bounds=BOUNDS)
+        stored = list(calculator.process_stream(winners_only=True, scenario=SCENARIO))
+        self.assertEqual([winner(prop.max_stats) for prop in stored], [winner(prop.max_stats) for prop in expected])
+
+    def test_failed_export_is_rejected(self):
+        self.export_failing()
+
+        self.assertTrue(GridStore.is_store(self.store_path))
+        with self.assertRaises(ValueError):
+            GridStore(self.store_path)
+
+    def test_failed_export_replaces_a_good_store(self):
+        self.assertTrue(self.export(BOUNDS))
+        self.export_failing()
+
+        with self.assertRaises(ValueError):
+            GridStore(self.store_path)
+
+
+if __name__ == '__main__':
+    unittest.main()
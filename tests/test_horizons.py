@@ -0,0 +1,94 @@
+import unittest
+
+from constants import *
+from exceptions import ExceededMaxDownpayment
+from exceptions import ExceededMaxMonthlyInstallment
+from exceptions import LessThanMinmumLoanPrincipal
+from fixtures import make_listings
+from horizons import HORIZON_YEARS
+from horizons import horizon_winners
+from permutation import Permutation
+from property import Property
+from scenario import DEFAULT_SCENARIO
+from scenario import Scenario
+
+
+SCENARIOS = (
+    DEFAULT_SCENARIO,
+    Scenario(bank_interest_rate=7.5, bank_loan_giving_fee=0.02, name='high rate with fees'),
+    Scenario(bank_interest_rate=3.0, max_downpayment=25000, max_monthly_installment=450,
+             minimum_loan_principal=30000, name='tight bank'),
+)
+
+BOUNDS = (1, 20, 20, 100)
+
+# the fixtures mostly lose money on any loan, one cheap listing whose no-loan option wins some horizons
+LISTINGS = make_listings() + [dict(price=36900.0, rent=276, reletting_factor=0.0, gov_tax_discount=0.0, area=45.0,
+                                   extra_onetime_expense=0, name='High yield', url='')]
+
+
+class HorizonWinnersTest(unittest.TestCase):
+    # the one pass over every horizon against a Permutation loop per horizon, like process_permutations
+
+    def brute_force(self, prop, scenario, horizon):
+        min_num_years, max_num_year, min_downpayment_percent, max_downpayment_percent = BOUNDS
+        max_roi = MINIMUM_DECIMAL
+        best = None
+        for num_years in range(min_num_years, max_num_year + 1):
+            for downpayment_percent in range(min_downpayment_percent, max_downpayment_percent + 1):
+                permutation = Permutation(prop, num_years, downpayment_percent, scenario)
+                try:
+                    permutation.calculate()
+                except ExceededMaxDownpayment:
+                    break
+                except (ExceededMaxMonthlyInstallment, LessThanMinmumLoanPrincipal):
+                    continue
+
+                permutation.calc_x_years_roi(period_years=horizon)
+                if permutation.x_years_avg_annual_roi > max_roi:
+                    max_roi = permutation.x_years_avg_annual_roi
+                    best = (num_years, downpayment_percent)
+        return best, max_roi
+
+    def test_against_permutations(self):
+        full_downpayment_winners = 0
+        for scenario in SCENARIOS:
+            for listing in LISTINGS:
+                prop = Property(**listing)
+                prop.process(*BOUNDS, engine='grid', scenario=scenario)
+                winners = horizon_winners(prop, prop.permutation_stats)
+                prop.process_horizons()
+
+                for horizon in HORIZON_YEARS:
+                    with self.subTest(scenario=scenario.name, listing=listing['name'], horizon=horizon):
+                        expected, max_roi = self.brute_force(prop, scenario, horizon)
+                        self.assertEqual(winners[horizon], expected)
+                        self.assertEqual(prop.max_roi_by_horizon[horizon], max_roi)
+
+                        if expected is not None and expected[1] == 100:
+                            # a full downpayment carries no loan, whatever the year row
+                            self.assertEqual(prop.max_stats_by_horizon[horizon].num_years, 0)
+                            full_downpayment_winners += 1
+
+        # the fixtures have to reach the no-loan case for it to be checked
+        self.assertGreater(full_downpayment_winners, 0)
+
+    def test_horizon_of_the_run(self):
+        # the horizon the grid was processed with gives back the x-years winner
+        for listing in LISTINGS:
+            with self.subTest(listing=listing['name']):
+                prop = Property(**listing)
+                prop.process(*BOUNDS, engine='grid')
+                winner = horizon_winners(prop, prop.permutation_stats, [VISUALIZING_ROI_YEARS])[VISUALIZING_ROI_YEARS]
+
+                expected = prop.max_stats_x_years
+                if expected is None:
+                    self.assertIsNone(winner)
+                    continue
+                self.assertEqual(winner[1], expected.downpayment_percent)
+                if expected.downpayment_percent != 100:
+                    self.assertEqual(winner[0], expected.num_years)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+import os
+import tempfile
+import unittest
+
+from constants import *
+from fixtures import make_listings
+from fixtures import winner
+from property import Property
+from result_cache import INPUT_FIELDS
+from result_cache import ResultCache
+from scenario import DEFAULT_SCENARIO
+from scenario import Scenario
+
+
+SCENARIO = Scenario(bank_interest_rate=6.0, bank_loan_giving_fee=0.01, name='cached')
+BOUNDS = (1, 20, 20, 100)
+
+
+class ResultCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'results.sqlite')
+        self.cache = ResultCache(self.path)
+        self.listing = make_listings()[0]
+
+    def tearDown(self):
+        self.cache.close()
+        self.directory.cleanup()
+
+    def processed(self, listing, scenario=SCENARIO, bounds=BOUNDS):
+        prop = Property(**listing)
+        prop.process(*bounds, engine='permutation', scenario=scenario)
+        return prop
+
+    def store(self, listing, scenario=SCENARIO, bounds=BOUNDS):
+        prop = self.processed(listing, scenario, bounds)
+        self.cache.store(prop, scenario, bounds)
+        self.cache.commit()
+        return prop
+
+    def load(self, listing, scenario=SCENARIO, bounds=BOUNDS, cache=None):
+        prop = Property(**listing)
+        return (cache or self.cache).load(prop, scenario, bounds), prop
+
+    def test_hit_restores_the_winners(self):
+        for listing in make_listings():
+            with self.subTest(listing=listing['name']):
+                expected = self.store(listing)
+                hit, prop = self.load(listing)
+
+                self.assertTrue(hit)
+                self.assertEqual(winner(prop.max_stats), winner(expected.max_stats))
+                self.assertEqual(winner(prop.max_stats_x_years), winner(expected.max_stats_x_years))
+                self.assertEqual(prop.max_roi, expected.max_roi)
+                self.assertEqual(prop.max_roi_x_years, expected.max_roi_x_years)
+
+    def test_hits_and_misses_are_counted(self):
+        self.assertFalse(self.load(self.listing)[0])
+        self.store(self.listing)
+        self.assertTrue(self.load(self.listing)[0])
+        self.assertTrue(self.load(self.listing)[0])
+
+        self.assertEqual(self.cache.stats(), {'hits': 2, 'misses': 1, 'size': 1})
+
+    def test_other_scenario_misses(self):
+        self.store(self.listing)
+
+        self.assertFalse(self.load(self.listing, scenario=DEFAULT_SCENARIO)[0])
+        # the name is a label only, the terms are what the key holds
+        renamed = Scenario(bank_interest_rate=6.0, bank_loan_giving_fee=0.01, name='renamed')
+        self.assertTrue(self.load(self.listing, scenario=renamed)[0])
+
+    def test_other_bounds_miss(self):
+        self.store(self.listing)
+
+        for bounds in ((1, 20, 30, 100), (1, 25, 20, 100), (2, 20, 20, 100), (1, 20, 20, 90)):
+            with self.subTest(bounds=bounds):
+                self.assertFalse(self.load(self.listing, bounds=bounds)[0])
+
+    def test_changed_listing_fields_miss(self):
+        self.store(self.listing)
+
+        for field in INPUT_FIELDS:
+            with self.subTest(field=field):
+                listing = dict(self.listing)
+                listing[field] = self.listing[field] + 1
+                self.assertFalse(self.load(listing)[0])
+
+        # fields outside the calculation don't change the winners
+        listing = dict(self.listing, name='Renamed', url='http://example.com')
+        self.assertTrue(self.load(listing)[0])
+
+    def test_resolution_gets_its_own_key(self):
+        prop = self.processed(self.listing)
+        self.cache.store(prop, SCENARIO, BOUNDS, resolution=(1, 10))
+
+        self.assertFalse(self.load(self.listing)[0])
+        self.assertTrue(self.cache.load(Property(**self.listing), SCENARIO, BOUNDS, resolution=(1, 10)))
+        self.assertFalse(self.cache.load(Property(**self.listing), SCENARIO, BOUNDS, resolution=(1, 20)))
+
+    def test_other_version_misses_and_is_pruned(self):
+        self.store(self.listing)
+
+        cache = ResultCache(self.path, version='other')
+        try:
+            self.assertFalse(self.load(self.listing, cache=cache)[0])
+            self.assertEqual(cache.prune(), 1)
+            self.assertEqual(cache.stats()['size'], 0)
+        finally:
+            cache.close()
+
+    def test_invalidate_drops_everything(self):
+        self.store(self.listing)
+        self.cache.invalidate()
+
+        self.assertFalse(self.load(self.listing)[0])
+        self.assertEqual(self.cache.stats()['size'], 0)
+
+    def test_prune_by_age(self):
+        self.store(self.listing)
+
+        self.assertEqual(self.cache.prune(max_age_days=1), 0)
+        self.assertEqual(self.cache.prune(max_age_days=-1), 1)
+        self.assertFalse(self.load(self.listing)[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import math
+import unittest
+
+import numpy as np
+
+from constants import *
+from scenario import Scenario
+from schedule import RatePlan
+from schedule import ScheduleEngine
+
+
+PRINCIPAL = 100000.0
+NUM_PAYMENTS = int(20 * MONTHS)
+FIXED_RATE = 3.0
+VARIABLE_RATE = 6.0
+FIXED_YEARS = 2
+OVERPAYMENT = 400.0
+
+SCENARIO = Scenario(bank_interest_rate=FIXED_RATE, name='schedule')
+
+
+def monthly(rate):
+    return rate / 100.0 / MONTHS
+
+
+def annuity(principal, rate, num_payments):
+    growth = (1 + rate) ** num_payments
+    return principal * rate * growth / (growth - 1)
+
+
+def balance_after(principal, rate, paid, num_payments):
+    # closed form balance after `num_payments` payments of `paid`, installment and overpayment together
+    growth = (1 + rate) ** num_payments
+    return principal * growth - paid * (growth - 1) / rate
+
+
+def payments_to_clear(balance, rate, payment):
+    return int(math.ceil(-math.log(1 - rate * balance / payment) / math.log(1 + rate) - 1e-9))
+
+
+class ScheduleTest(unittest.TestCase):
+    # the schedules against the annuity formulas worked out by hand, one loan each
+
+    def build(self, rate_plan=None, overpayments=0.0):
+        return ScheduleEngine(rate_plan, overpayments).build([PRINCIPAL], [NUM_PAYMENTS], SCENARIO)
+
+    def rate_plan(self):
+        return RatePlan.fixed_then_variable(FIXED_RATE, FIXED_YEARS, VARIABLE_RATE)
+
+    def test_no_steps(self):
+        schedule = self.build()
+        installment = annuity(PRINCIPAL, monthly(FIXED_RATE), NUM_PAYMENTS)
+
+        np.testing.assert_allclose(schedule.payment[0], installment, rtol=1e-9)
+        self.assertAlmostEqual(schedule.principal[0].sum(), PRINCIPAL, places=6)
+        self.assertAlmostEqual(schedule.total_interest()[0], installment * NUM_PAYMENTS - PRINCIPAL, places=4)
+        self.assertAlmostEqual(schedule.balance_at(NUM_PAYMENTS)[0], 0.0, places=6)
+        self.assertEqual(schedule.payoff_month()[0], NUM_PAYMENTS)
+
+    def test_fixed_then_variable(self):
+        schedule = self.build(self.rate_plan())
+        step = int(FIXED_YEARS * MONTHS)
+        fixed_installment = annuity(PRINCIPAL, monthly(FIXED_RATE), NUM_PAYMENTS)
+        step_balance = balance_after(PRINCIPAL, monthly(FIXED_RATE), fixed_installment, step)
+        variable_installment = annuity(step_balance, monthly(VARIABLE_RATE), NUM_PAYMENTS - step)
+
+        np.testing.assert_allclose(schedule.payment[0, :step], fixed_installment, rtol=1e-9)
+        self.assertAlmostEqual(schedule.balance_at(step)[0], step_balance, places=4)
+        np.testing.assert_allclose(schedule.payment[0, step:], variable_installment, rtol=1e-9)
+        self.assertAlmostEqual(schedule.balance_at(NUM_PAYMENTS)[0], 0.0, places=6)
+        self.assertEqual(schedule.payoff_month()[0], NUM_PAYMENTS)
+
+    def test_overpayment_shortens_the_term_across_a_step(self):
+        schedule = self.build(self.rate_plan(), OVERPAYMENT)
+        step = int(FIXED_YEARS * MONTHS)
+        fixed_installment = annuity(PRINCIPAL, monthly(FIXED_RATE), NUM_PAYMENTS)
+        step_balance = balance_after(PRINCIPAL, monthly(FIXED_RATE), fixed_installment + OVERPAYMENT, step)
+
+        # the step recasts over the term the overpayments left, not over the original one
+        remaining_payments = payments_to_clear(step_balance, monthly(FIXED_RATE), fixed_installment)
+        self.assertLess(remaining_payments, NUM_PAYMENTS - step)
+        variable_installment = annuity(step_balance, monthly(VARIABLE_RATE), remaining_payments)
+
+        np.testing.assert_allclose(schedule.payment[0, :step], fixed_installment, rtol=1e-9)
+        self.assertAlmostEqual(schedule.balance_at(step)[0], step_balance, places=4)
+        self.assertAlmostEqual(schedule.payment[0, step], variable_installment, places=6)
+
+        # the overpayments keep going after the step, so the loan clears before the recast term
+        payoff_month = schedule.payoff_month()[0]
+        self.assertLessEqual(payoff_month, step + remaining_payments)
+        self.assertLess(payoff_month, self.build(self.rate_plan()).payoff_month()[0])
+        self.assertAlmostEqual(schedule.balance_at(payoff_month)[0], 0.0, places=6)
+
+        recast_balance = balance_after(step_balance, monthly(VARIABLE_RATE),
+                                       variable_installment + OVERPAYMENT, payoff_month - step - 1)
+        self.assertAlmostEqual(schedule.balance_at(payoff_month - 1)[0], recast_balance, places=4)
+
+
+if __name__ == '__main__':
+    unittest.main()
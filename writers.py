@@ -0,0 +1,190 @@
+import abc
+import csv
+
+from constants import *
+from metrics import NullMetrics
+from metrics import STATUS_NAMES
+from permutation import calc_equity_with_loan
+from permutation_grid import METRICS
+from permutation_grid import STATUS_OK
+
+
+KEY_COLUMNS = ('property_index', 'name', 'url', 'num_years', 'downpayment_percent', 'status')
+
+# replayed from the stored metrics with the same expressions Permutation.calculate uses
+DERIVED_METRICS = ('num_payments', 'total_monthly_outcome', 'monthly_ROI', 'equity_with_loan', 'equity_x_years')
+
+METRIC_COLUMNS = METRICS + DERIVED_METRICS
+
+COLUMNS = KEY_COLUMNS + METRIC_COLUMNS
+
+
+class Writer(abc.ABC):
+    # What export() streams into and the writers registry holds: open() once, write_property() for
+    # every property as it arrives, finish() once all of them are written and close() at the end,
+    # even when the run fails. write() does the same for the properties of a finished run.
+
+    # metrics stage the properties are written under
+    property_stage = 'write_properties'
+
+    def __init__(self, data=None, output_file_path='output', metrics=None):
+        self.data = data
+        self.output_file_path = output_file_path
+        self.metrics = metrics or NullMetrics()
+
+    def write(self):
+        self.open()
+        try:
+            with self.metrics.stage(self.property_stage):
+                for prop in self.data['properties']:
+                    self.write_property(prop)
+            self.finish()
+        finally:
+            self.close()
+
+        print('Wrote results to {}'.format(self.output_file_path))
+
+    @abc.abstractmethod
+    def open(self):
+        pass
+
+    @abc.abstractmethod
+    def write_property(self, prop):
+        pass
+
+    def finish(self):
+        # only reached when every property was written, for what marks the output complete
+        pass
+
+    @abc.abstractmethod
+    def close(self):
+        pass
+
+
+class PermutationRowWriter(Writer):
+    # Long format export, one row per evaluated (property, num_years, downpayment_percent) cell.
+    # Rows go out as each property is handed over, so nothing but the current property's grid
+    # is ever held in memory.
+
+    def __init__(self, data=None, output_file_path='output', metrics=None):
+        super(PermutationRowWriter, self).__init__(data, output_file_path, metrics)
+        self.property_index = 0
+
+    def iter_rows(self, prop):
+        if not prop.permutation_stats:
+            return
+
+        for num_years, downpayment_percent, status, record in prop.permutation_stats.iter_evaluated_cells():
+            key = (self.property_index, prop.name, prop.url, num_years, downpayment_percent, STATUS_NAMES[status])
+
+            if status != STATUS_OK:
+                yield key + (None,) * len(METRIC_COLUMNS)
+                continue
+
+            values = dict(zip(METRICS, record))
+            loan_years = 0 if downpayment_percent == 100 else num_years
+            equity_with_loan = calc_equity_with_loan(values['equity'], values['total_annual_income'], loan_years)
+
+            yield key + tuple(record) + (
+                loan_years * MONTHS,
+                prop.expense_total_monthly + values['monthly_installments'],
+                values['total_monthly_income'] / values['equity'],
+                equity_with_loan,
+                equity_with_loan,
+            )
+
+    def write_property(self, prop):
+        num_rows = self.write_rows(self.iter_rows(prop))
+        self.metrics.count('exported_rows', num_rows)
+        self.property_index += 1
+
+    @abc.abstractmethod
+    def write_rows(self, rows):
+        # returns the number of rows written
+        pass
+
+
+class PermutationCSVWriter(PermutationRowWriter):
+
+    def __init__(self, data=None, output_file_path='output.csv', metrics=None):
+        super(PermutationCSVWriter, self).__init__(data, output_file_path, metrics)
+
+    def open(self):
+        self.output_file = open(self.output_file_path, 'wt', newline='')
+        self.writer = csv.writer(self.output_file)
+        self.writer.writerow(COLUMNS)
+
+    def write_rows(self, rows):
+        num_rows = 0
+        for row in rows:
+            self.writer.writerow(row)
+            num_rows += 1
+        return num_rows
+
+    def close(self):
+        self.output_file.close()
+
+
+class PermutationParquetWriter(PermutationRowWriter):
+
+    def __init__(self, data=None, output_file_path='output.parquet', metrics=None,
+                 row_group_size=PARQUET_ROW_GROUP_SIZE):
+        super(PermutationParquetWriter, self).__init__(data, output_file_path, metrics)
+        self.row_group_size = row_group_size
+
+    def open(self):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError('Parquet export needs pyarrow, install it with "pip install pyarrow"')
+
+        self.pyarrow = pyarrow
+        self.schema = pyarrow.schema(
+            [
+                ('property_index', pyarrow.int64()),
+                ('name', pyarrow.string()),
+                ('url', pyarrow.string()),
+                ('num_years', pyarrow.int16()),
+                ('downpayment_percent', pyarrow.int16()),
+                ('status', pyarrow.dictionary(pyarrow.int8(), pyarrow.string())),
+            ] + [
+                (name, pyarrow.float64()) for name in METRIC_COLUMNS
+            ]
+        )
+        self.writer = pyarrow.parquet.ParquetWriter(self.output_file_path, self.schema)
+        self.pending = [[] for _ in COLUMNS]
+        self.pending_rows = 0
+
+    def write_rows(self, rows):
+        num_rows = 0
+        for row in rows:
+            for column, value in zip(self.pending, row):
+                column.append(value)
+            num_rows += 1
+
+        self.pending_rows += num_rows
+        if self.pending_rows >= self.row_group_size:
+            self.flush()
+        return num_rows
+
+    def flush(self):
+        if not self.pending_rows:
+            return
+
+        table = self.pyarrow.Table.from_arrays(
+            [
+                self.pyarrow.array(values, type=field.type) if field.name != 'status'
+                else self.pyarrow.array(values).dictionary_encode().cast(field.type)
+                for values, field in zip(self.pending, self.schema)
+            ],
+            schema=self.schema,
+        )
+        self.writer.write_table(table)
+
+        self.pending = [[] for _ in COLUMNS]
+        self.pending_rows = 0
+
+    def close(self):
+        self.flush()
+        self.writer.close()